@@ -1,39 +1,94 @@
-from PyQt5.QtCore import QTimer
+import time
+from PyQt5.QtCore import QTimer, Qt
 
 class AnimationController:
-    """Controls animation timing and states"""
+    """Controls animation timing and states
     
-    def __init__(self, interval=250, callback=None):
-        self.interval = interval
+    Every animated tile shows frame (elapsed time // frame duration) % frame count,
+    measured on a monotonic clock. Instead of ticking at a fixed interval, a
+    single-shot timer wakes up at the next frame change of a visible tile.
+    """
+    
+    def __init__(self, callback=None, visible_tiles=None):
+        # callback(frames) receives tile_id -> frame index of the tiles that changed
         self.callback = callback
-        self.anim_state = 0
+        # visible_tiles() returns the animated tile ids on screen, None for all
+        self.visible_tiles = visible_tiles
+        self.animations = {}  # tile_id -> (frame count, frame duration in ms)
+        self.frames = {}      # tile_id -> frame index last reported
         self.enabled = True
+        # Reasons the clock is suspended (e.g. "minimized", "modal"), runs when empty
+        self.pause_reasons = set()
+        self.start_time = time.monotonic()
         self.timer = QTimer()
-        self.timer.timeout.connect(self._update_animation)
-        self.timer.start(interval)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.refresh)
+    
+    def set_animations(self, animations):
+        """Set tile_id -> (frame count, frame duration) of the animated tiles"""
+        self.animations = dict(animations)
+        self.frames = {}
+        self.refresh()
+    
+    def elapsed(self):
+        """Get the animation time in ms"""
+        return int((time.monotonic() - self.start_time) * 1000)
+    
+    def refresh(self):
+        """Bring visible tiles to the current frame and schedule the next change"""
+        self.timer.stop()
+        if not self.enabled or self.pause_reasons:
+            return
+        
+        elapsed = self.elapsed()
+        tile_ids = self.animations if self.visible_tiles is None else self.visible_tiles()
+        changed = {}
+        next_change = None
+        for tile_id in tile_ids:
+            if tile_id not in self.animations:
+                continue
+            frame_count, duration = self.animations[tile_id]
+            step = elapsed // duration
+            frame = step % frame_count
+            if self.frames.get(tile_id) != frame:
+                self.frames[tile_id] = frame
+                changed[tile_id] = frame
+            if frame_count > 1:
+                change_time = (step + 1) * duration
+                if next_change is None or change_time < next_change:
+                    next_change = change_time
+        
+        # Sleep until the next visible frame change, or until refreshed
+        if next_change is not None:
+            self.timer.start(next_change - elapsed)
+        
+        if changed and self.callback:
+            self.callback(changed)
     
-    def _update_animation(self):
-        """Update animation state and call callback"""
-        if self.enabled:
-            self.anim_state = (self.anim_state + 1) % 4
-            if self.callback:
-                self.callback(self.anim_state)
+    def pause(self, reason):
+        """Suspend the clock until resume() is called for every reason"""
+        self.pause_reasons.add(reason)
+        self.timer.stop()
+    
+    def resume(self, reason):
+        """Resume the clock if nothing else keeps it paused"""
+        self.pause_reasons.discard(reason)
+        self.refresh()
+    
+    def is_running(self):
+        """Check if a wake-up for the next frame change is scheduled"""
+        return self.timer.isActive()
     
     def set_enabled(self, enabled):
         """Enable or disable animations"""
         self.enabled = enabled
+        self.frames = {}
         if enabled:
-            self.timer.start()
+            self.refresh()
         else:
             self.timer.stop()
-            self.anim_state = 0
-            if self.callback:
-                self.callback(self.anim_state)
     
     def is_enabled(self):
         """Check if animations are enabled"""
         return self.enabled
-    
-    def get_state(self):
-        """Get current animation state (0-3)"""
-        return self.anim_state
@@ -0,0 +1,34 @@
+# animated tile definitions, used by the map editor and lvl2tiled.py
+# pure Python, no Qt
+import sys
+import json
+
+from constants import ANIMATIONS_FILE, ANIMATION_INTERVAL
+
+def parse_animations(animations):
+    """Get (tile id, frames, frame duration) of animation definitions
+    
+    Raises KeyError, TypeError or ValueError for an invalid entry.
+    """
+    parsed = []
+    for animation in animations:
+        tile_id = int(animation["tile"])
+        frames = [int(frame) for frame in animation["frames"]]
+        duration = int(animation.get("duration", ANIMATION_INTERVAL))
+        if not frames or min(frames) < 0:
+            raise ValueError(f"Invalid frames of animated tile {tile_id}")
+        parsed.append((tile_id, frames, max(1, duration)))
+    return parsed
+
+def load_animations(path=ANIMATIONS_FILE):
+    """Load (tile id, animtiles.png frames, frame duration) of the animated tiles
+    
+    The definition file is the only source, if it is missing or invalid there
+    are no animated tiles.
+    """
+    try:
+        with open(path) as f:
+            return parse_animations(json.load(f)["animations"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Warning: Could not read animations from {path}: {e}", file=sys.stderr)
+        return []
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# benchmark suite of the editor hot paths
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import xml.etree.ElementTree as ET
+
+# Qt draws into offscreen windows, no display is needed
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from constants import TILE_SIZE
+from synthetic_tiles import create_synthetic_tilesets
+
+# Runs of every benchmark after one warm-up run
+DEFAULT_REPEAT = 20
+# A benchmark regresses if its median is slower than the baseline by this fraction ...
+DEFAULT_THRESHOLD = 0.25
+# ... and by at least this many ms (timer noise of very short benchmarks)
+DEFAULT_MIN_DELTA = 0.05
+# Cells painted by one drag stroke, cells changed for a partial redraw
+DRAG_CELLS = 1000
+PARTIAL_CELLS = 100
+LEVEL_FORMATS = ("PET", "MSD", "X16")
+
+def quiet():
+    """Hide the reports of the level loaders and converters"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+def measure(func, repeat):
+    """Time repeat calls of func after a warm-up call, returns the run times in ms"""
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+class BenchmarkSuite:
+    """Times the hot paths of the editor on the levels of a directory
+    
+    Results are name -> run times in ms. The editor benchmarks run on a hidden
+    TileMapEditor window of the offscreen platform, with animations off so that
+    only the benchmarked work is painted.
+    """
+    
+    def __init__(self, maps_dir, tileset_dir, repeat, temp_dir, selection=None):
+        self.maps_dir = maps_dir
+        self.tileset_dir = tileset_dir
+        self.repeat = repeat
+        self.temp_dir = temp_dir
+        self.selection = selection
+        self.results = {}
+        self.app = None
+        self.editor = None
+        
+        from render_levels import find_levels
+        self.levels = find_levels([maps_dir]) if os.path.isdir(maps_dir) else []
+    
+    def selected(self, name):
+        """Check if a benchmark is selected by the -k option"""
+        return not self.selection or any(part in name for part in self.selection)
+    
+    def add(self, name, func, repeat=None):
+        """Run a benchmark if it is selected"""
+        if self.selected(name):
+            self.results[name] = measure(func, repeat or self.repeat)
+            print(f"{name:<45}{statistics.median(self.results[name]):10.3f} ms")
+    
+    def run(self):
+        """Run all benchmarks, returns the results"""
+        from PyQt5.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication(["benchmark"])
+        
+        self.bench_level_files()
+        self.bench_conversions()
+        self.bench_editor()
+        return self.results
+    
+    def bench_level_files(self):
+        """MapData.load_binary and save_binary of every level file"""
+        from map_data import MapData
+        
+        for path, relative in self.levels:
+            map_data = MapData()
+            output = os.path.join(self.temp_dir, "saved-level")
+            
+            def load():
+                with quiet():
+                    map_data.load_binary(path, verbose=False)
+            
+            def save():
+                map_data.save_binary(output, verbose=False)
+            
+            self.add(f"load_binary[{relative}]", load)
+            # Needs a loaded level
+            with quiet():
+                map_data.load_binary(path, verbose=False)
+            self.add(f"save_binary[{relative}]", save)
+    
+    def bench_conversions(self):
+        """cnvlvl.lvl_cnv for all format pairs, lvl2tiled and tiled2lvl round trip"""
+        import cnvlvl
+        import lvl2tiled
+        import tiled2lvl
+        
+        # One level file of every format, the detection sets the fill byte of the format
+        sources = {}
+        for path, relative in self.levels:
+            with open(path, "rb") as f:
+                level_data = f.read()
+            with quiet():
+                level_format = cnvlvl.det_lvl_form(level_data)
+            if level_format and level_format not in sources:
+                sources[level_format] = level_data
+        for from_format in LEVEL_FORMATS:
+            for to_format in LEVEL_FORMATS:
+                if from_format in sources:
+                    self.add(f"lvl_cnv[{from_format}->{to_format}]",
+                             lambda f=from_format, t=to_format: cnvlvl.lvl_cnv(f, t, sources[f]))
+        
+        for path, relative in self.levels[:1]:
+            output = os.path.join(self.temp_dir, "round-trip-level")
+            
+            def to_tmx():
+                level_data = lvl2tiled.load_map(path)
+                return ET.tostring(lvl2tiled.generate_tmx_file(level_data, path), "utf-8")
+            
+            def from_tmx():
+                tree = ET.ElementTree(ET.fromstring(tmx))
+                with quiet():
+                    tiled2lvl.save_robots_lvl(tiled2lvl.tmx_to_level_dict(tree), output)
+            
+            tmx = to_tmx()
+            self.add(f"lvl2tiled[{relative}]", to_tmx)
+            self.add(f"tiled2lvl[{relative}]", from_tmx)
+            if os.path.exists(output):
+                with open(path, "rb") as a, open(output, "rb") as b:
+                    if a.read() != b.read():
+                        print(f"Warning: The Tiled round trip of {relative} changed the level.")
+    
+    def bench_editor(self):
+        """Canvas redraws, drag strokes with undo/redo and the tile palette"""
+        if not any(self.selected(name) for name in
+                   ("update_canvas", "drag_stroke", "undo_stroke", "redo_stroke", "update_palette")):
+            return
+        from PyQt5.QtCore import Qt, QPoint, QEvent
+        from PyQt5.QtGui import QMouseEvent
+        from tilemap_editor import TileMapEditor
+        from tile_manager import TILES_ATLAS
+        
+        with quiet():
+            editor = TileMapEditor(tileset_dir=self.tileset_dir)
+            if "tiles.png" in editor.tile_manager.tileset_files:
+                editor.tileset_combo.setCurrentIndex(editor.tile_manager.tileset_files.index("tiles.png"))
+            if self.levels:
+                editor.load_binary_map(self.levels[0][0])
+        self.editor = editor
+        editor.animate_cb.setChecked(False)
+        editor.show()
+        self.app.processEvents()
+        
+        def paint():
+            # Paint the changed cells now instead of with the next display refresh
+            editor.update_map_display()
+            self.app.processEvents()
+        
+        def full_redraw():
+            editor.update_map_display(full=True)
+            self.app.processEvents()
+        
+        # Cells on screen, changed back and forth
+        x, y, width, height = editor.visible_map_rect()
+        cells = [(cell_x, cell_y) for cell_y in range(y, y + height) for cell_x in range(x, x + width)]
+        partial = random.Random(0).sample(cells, min(PARTIAL_CELLS, len(cells)))
+        
+        def partial_redraw():
+            editor.map_data.mark_dirty([cell_y * editor.map_data.width + cell_x
+                                        for cell_x, cell_y in partial])
+            paint()
+        
+        self.add("update_canvas[full]", full_redraw)
+        self.add(f"update_canvas[{len(partial)} cells]", partial_redraw)
+        
+        # Serpentine drag over the visible cells, one frame per mouse event
+        columns = max(1, width)
+        path = []
+        for index in range(DRAG_CELLS):
+            row, column = divmod(index, columns)
+            if row % 2:
+                column = columns - 1 - column
+            path.append(QPoint(column * TILE_SIZE + TILE_SIZE // 2, row * TILE_SIZE + TILE_SIZE // 2))
+        editor.palette.selected_tile = 77
+        
+        def drag_stroke():
+            editor.canvas.mousePressEvent(
+                QMouseEvent(QEvent.MouseButtonPress, path[0], Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+            for pos in path[1:]:
+                editor.canvas.mouseMoveEvent(
+                    QMouseEvent(QEvent.MouseMove, pos, Qt.NoButton, Qt.LeftButton, Qt.NoModifier))
+                paint()
+            editor.canvas.mouseReleaseEvent(
+                QMouseEvent(QEvent.MouseButtonRelease, path[-1], Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+            paint()
+        
+        def undo():
+            editor.undo()
+            self.app.processEvents()
+        
+        def redo():
+            editor.redo()
+            self.app.processEvents()
+        
+        # Every run paints the stroke, undoes and redoes it, and restores the map
+        stroke_times, undo_times, redo_times = [], [], []
+        if any(self.selected(name) for name in ("drag_stroke", "undo_stroke", "redo_stroke")):
+            for _ in range(self.repeat + 1):
+                stroke_times.append(self.time(drag_stroke))
+                undo_times.append(self.time(undo))
+                redo_times.append(self.time(redo))
+                editor.undo()
+            for name, times in ((f"drag_stroke[{DRAG_CELLS} cells]", stroke_times),
+                                (f"undo_stroke[{DRAG_CELLS} cells]", undo_times),
+                                (f"redo_stroke[{DRAG_CELLS} cells]", redo_times)):
+                if self.selected(name):
+                    # The first run is the warm-up
+                    self.results[name] = times[1:]
+                    print(f"{name:<45}{statistics.median(times[1:]):10.3f} ms")
+        
+        atlas = editor.tile_manager.atlases[TILES_ATLAS]
+        rects = editor.tile_manager.tile_rects
+        self.add("update_palette", lambda: editor.palette.update_palette(atlas, rects))
+        
+        editor.close()
+    
+    @staticmethod
+    def time(func):
+        """Time one call of func in ms"""
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+def summarize(results):
+    """Get name -> statistics of the run times of every benchmark"""
+    return {name: {"median_ms": round(statistics.median(times), 4),
+                   "min_ms": round(min(times), 4),
+                   "mean_ms": round(statistics.mean(times), 4),
+                   "runs": len(times)}
+            for name, times in results.items()}
+
+def compare(summary, baseline, threshold, min_delta):
+    """Print the change against a baseline, returns the names of regressed benchmarks"""
+    regressions = []
+    print(f"\n{'benchmark':<45}{'baseline':>10}{'current':>10}{'change':>9}")
+    for name, stats in summary.items():
+        if name not in baseline:
+            print(f"{name:<45}{'-':>10}{stats['median_ms']:10.3f}{'new':>9}")
+            continue
+        old = baseline[name]["median_ms"]
+        new = stats["median_ms"]
+        change = (new - old) / old if old else 0
+        regressed = change > threshold and new - old > min_delta
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<45}{old:10.3f}{new:10.3f}{change:+8.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog = 'benchmark',
+             description = "Time the hot paths of the map editor without opening windows.")
+    
+    parser.add_argument("-m", "--maps",
+                        default = "maps",
+                        help = "directory with the level files (default: maps)")
+    
+    parser.add_argument("-t", "--tiles",
+                        default = "tiles",
+                        help = "tileset directory, synthetic tilesets are used if it is missing (default: tiles)")
+    
+    parser.add_argument("-r", "--repeat",
+                        type = int,
+                        default = DEFAULT_REPEAT,
+                        help = f"runs of every benchmark (default: {DEFAULT_REPEAT})")
+    
+    parser.add_argument("-k", "--select",
+                        action = "append",
+                        help = "only run benchmarks whose name contains this text; e.g. -k load_binary")
+    
+    parser.add_argument("-o", "--output",
+                        help = "write the results to a JSON file; e.g. benchmark.json")
+    
+    parser.add_argument("-b", "--baseline",
+                        help = "compare with the results in a JSON file, fail on regressions")
+    
+    parser.add_argument("--threshold",
+                        type = float,
+                        default = DEFAULT_THRESHOLD,
+                        help = f"allowed slowdown against the baseline (default: {DEFAULT_THRESHOLD} = 25%%)")
+    
+    parser.add_argument("--min-delta",
+                        type = float,
+                        default = DEFAULT_MIN_DELTA,
+                        help = f"ignore slowdowns below this many ms (default: {DEFAULT_MIN_DELTA})")
+    
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tileset_dir = args.tiles
+        synthetic = not os.path.exists(os.path.join(tileset_dir, "tiles.png"))
+        if synthetic:
+            from PyQt5.QtWidgets import QApplication
+            app = QApplication.instance() or QApplication(["benchmark"])
+            tileset_dir = os.path.join(temp_dir, "tiles")
+            os.makedirs(tileset_dir)
+            create_synthetic_tilesets(tileset_dir)
+            print(f"No tileset in '{args.tiles}', using synthetic tilesets.\n")
+        
+        suite = BenchmarkSuite(args.maps, tileset_dir, args.repeat, temp_dir, args.select)
+        if not suite.levels:
+            print(f"No level files found in '{args.maps}'.")
+            return 1
+        summary = summarize(suite.run())
+    
+    from PyQt5.QtCore import QT_VERSION_STR
+    report = {
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "tileset": "synthetic" if synthetic else "tiles",
+        "repeat": args.repeat,
+        "results": summary,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}.")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(summary, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than "
+                  f"{args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
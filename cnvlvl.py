@@ -182,38 +182,42 @@ def lvl_cnv(from_ver, to_ver, level_data):
     level = level + unit_bytes + fill_bytes + map_bytes
     return level
 
-############# Argument parser START
-parser = argparse.ArgumentParser(prog = 'cnvlvl', 
-         description = "Convert level for different Robots versions.")
-
-#filename is required
-parser.add_argument('filename',
-                    type = str,
-                    help = 'filename of the level to be converted; e.g. level-a')
-
-# convert to
-parser.add_argument('convert_to',
-                    type = str,
-                    default = 'X16',
-                    choices = ['PET', 'MSD', 'X16'],
-                    help    = 'Target level format for conversion. PET includes C64 and \
-                               C128, MSD includes MS-DOS and Amiga. The file extension \
-                               denotes the format of the converted level, e.g. level-a.PET')
-
-args = parser.parse_args()
-############# Argument parser END
-
-# read level data
-level_data = read_level(args.filename)
-# determine level version
-level_ver  = det_lvl_form(level_data)
-
-if level_ver:
-    # convert the level to the specified version
-    cnv_level = lvl_cnv(level_ver, args.convert_to, level_data)
-    # save the level in the new format
-    save_level(cnv_level, args.filename, args.convert_to)
-else:
-    # exit in case of unknown level architecture
-    print("\nFiles with unknown level architecture can't be converted. Exit.")
-    sys.exit(1)
+def main():
+    ############# Argument parser START
+    parser = argparse.ArgumentParser(prog = 'cnvlvl', 
+             description = "Convert level for different Robots versions.")
+
+    #filename is required
+    parser.add_argument('filename',
+                        type = str,
+                        help = 'filename of the level to be converted; e.g. level-a')
+
+    # convert to
+    parser.add_argument('convert_to',
+                        type = str,
+                        default = 'X16',
+                        choices = ['PET', 'MSD', 'X16'],
+                        help    = 'Target level format for conversion. PET includes C64 and \
+                                   C128, MSD includes MS-DOS and Amiga. The file extension \
+                                   denotes the format of the converted level, e.g. level-a.PET')
+
+    args = parser.parse_args()
+    ############# Argument parser END
+
+    # read level data
+    level_data = read_level(args.filename)
+    # determine level version
+    level_ver  = det_lvl_form(level_data)
+
+    if level_ver:
+        # convert the level to the specified version
+        cnv_level = lvl_cnv(level_ver, args.convert_to, level_data)
+        # save the level in the new format
+        save_level(cnv_level, args.filename, args.convert_to)
+    else:
+        # exit in case of unknown level architecture
+        print("\nFiles with unknown level architecture can't be converted. Exit.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,56 @@
 # Application constants
+import os
 
 # Tile and map dimensions
 TILE_SIZE = 24
 DEFAULT_MAP_WIDTH = 128
 DEFAULT_MAP_HEIGHT = 64
 
-# Animation timing (ms)
+# Number of tile ids a level can hold (one byte per cell)
+TABLE_SIZE = 256
+
+# Tile id of an erased cell, outside the byte range so every tile byte stays valid (saved as 0)
+EMPTY_TILE = -1
+
+# Animation timing (ms), default frame duration of an animated tile
 ANIMATION_INTERVAL = 250
 
 # Application dimensions
 APP_WIDTH = 1200
 APP_HEIGHT = 800
 
+# Undo history memory budget (bytes)
+UNDO_MEMORY_LIMIT = 16 * 1024 * 1024
+
 # Navigation settings
 DEFAULT_NAV_SPEED = 1
 
 # Animated tiles filename
 ANIM_TILES_NAME = "animtiles.png"
+# Animated tile definitions (tile id, frames in the animated tileset, frame duration)
+ANIMATIONS_FILE = "animations.json"
+# Decode the animated tileset only when the first animation frame is drawn
+LAZY_ANIM_TILES = True
+
+# Decoded tileset cache: directory and size limit (bytes)
+TILE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "robots-mapedit")
+TILE_CACHE_LIMIT = 64 * 1024 * 1024
+# Worker threads decoding the other tilesets of the directory in the background
+TILESET_PRELOAD_WORKERS = 4
+# Wait after the last change of a tileset file before reloading it (ms)
+TILESET_RELOAD_DELAY = 150
+
+# Profiler: recorded spans and frames, statistics window (s),
+# longest input to paint latency (ms), HUD update interval (ms)
+PROFILER_MAX_SPANS = 200000
+PROFILER_WINDOW = 1.0
+PROFILER_INPUT_TIMEOUT = 1000
+PROFILER_HUD_INTERVAL = 500
 
 # UI settings
 PALETTE_COLS = 15
 GRID_COLOR = (200, 200, 200, 100)
+PALETTE_GRID_COLOR = (200, 200, 200, 255)
 SELECTION_COLOR = "red"
 TILE_FONT_COLOR = (0, 255, 0, 255)
 SHOW_TILE_NUMBER = True
@@ -31,6 +61,12 @@ ROBOT_COLOR  = "red"
 DOOR_COLOR   = "green"
 ITEM_COLOR   = "magenta"
 
+# Tiles a unit label can extend to each side of its unit
+UNIT_LABEL_REACH = 2
+
+# Level file sizes: MS-DOS and Amiga, PET/C64/C128, X16
+LEVEL_FILE_SIZES = (8960, 8962, 8706)
+
 # Offsets
 UNIT_TYPES_OFFSET  = 0x0000 
 UNIT_X_OFFSET      = 0x0040 
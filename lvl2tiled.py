@@ -4,6 +4,8 @@ import argparse
 import sys
 import os
 
+from animation_defs import load_animations
+
 # map sizes
 MAP_WIDTH = 128
 MAP_HEIGHT = 64 
@@ -24,7 +26,9 @@ ANIM_DURATION = 250 #ms
 # combined tiles.png and animtiles.png to show animations
 # if not present, dont't show animated tiles
 MERGED_TILES = "tiles/merged_tiles.png" 
-
+# animtiles.png frames start after the 253 tiles of tiles.png in merged_tiles.png
+MERGED_ANIM_START = 253
+MERGED_ANIM_FRAMES = 24
 
 # unit types
 unit_types = {
@@ -188,11 +192,11 @@ def load_map(filename = "level-a"):
         return level_dict
         
     except IOError as e:
-        print(f"Error loading binary map file '{filepath}': {e} . Exit.")
+        print(f"Error loading binary map file '{filename}': {e} . Exit.")
         sys.exit(1)
 
 # generate the xml for Tiled        
-def generate_tmx_file(tile_data, name):
+def generate_tmx_file(level_data, name):
 
     map_attrib = {
         "version"     : "1.10",
@@ -345,22 +349,19 @@ def generate_tmx_file(tile_data, name):
     tile_set_elem = ET.SubElement(map_elem, "tileset", tile_set_bg_attrib)
     image_elem    = ET.SubElement(tile_set_elem, "image", image_bg_attrib) 
     if os.path.exists(MERGED_TILES):
-        add_animation( 66, 253, 256, ANIM_DURATION, tile_set_elem) # flag
-        add_animation(143, 269, 272, ANIM_DURATION, tile_set_elem) # server
-        add_animation(148, 257, 260, ANIM_DURATION, tile_set_elem) # trash compactor
-        add_animation(196, 261, 262, ANIM_DURATION, tile_set_elem) # fan
-        add_animation(197, 263, 264, ANIM_DURATION, tile_set_elem) # fan
-        add_animation(200, 265, 266, ANIM_DURATION, tile_set_elem) # fan
-        add_animation(201, 267, 268, ANIM_DURATION, tile_set_elem) # fan
-        add_animation(204, 273, 276, ANIM_DURATION, tile_set_elem) # water
+        for tile_id, frames, duration in load_animations():
+            # only frames contained in merged_tiles.png
+            if max(frames) < MERGED_ANIM_FRAMES:
+                add_frame_animation(tile_id, [MERGED_ANIM_START + frame for frame in frames],
+                                    duration, tile_set_elem)
         
     
     tile_set_elem = ET.SubElement(map_elem, "tileset", tile_set_sprites_attrib)
     image_elem    = ET.SubElement(tile_set_elem, "image", image_sprites_attrib)
-    add_animation( 0,  0, 15, ANIM_DURATION, tile_set_elem) # player
-    add_animation(49, 49, 52, ANIM_DURATION, tile_set_elem) # hover bot
-    add_animation(53, 53, 56, ANIM_DURATION, tile_set_elem) # roller bot
-    add_animation(57, 57, 72, ANIM_DURATION, tile_set_elem) # evil bot
+    add_frame_animation( 0, range( 0, 16), ANIM_DURATION, tile_set_elem) # player
+    add_frame_animation(49, range(49, 53), ANIM_DURATION, tile_set_elem) # hover bot
+    add_frame_animation(53, range(53, 57), ANIM_DURATION, tile_set_elem) # roller bot
+    add_frame_animation(57, range(57, 73), ANIM_DURATION, tile_set_elem) # evil bot
     
     tile_set_elem   = ET.SubElement(map_elem, "tileset", tile_set_secrets_attrib)
     image_elem    = ET.SubElement(tile_set_elem, "image", image_secrets_attrib) 
@@ -470,14 +471,14 @@ def add_object_groups(id, name, map_elem, level_data, unit_id_start, unit_id_end
             }
             ET.SubElement(propties_elem, "property", prop_attrib) 
 
-def add_animation(id, start_frame, end_frame, duration, tile_set_elem):
+def add_frame_animation(id, frames, duration, tile_set_elem):
     tile_attrib = {
         "id":str(id)
     }
     tile_elem =  ET.SubElement(tile_set_elem, "tile", tile_attrib)
     anim_elem =  ET.SubElement(tile_elem, "animation")
     
-    for tile_id in range(start_frame, end_frame + 1):
+    for tile_id in frames:
         frame_attrib = {
             "tileid"  : str(tile_id),
             "duration": str(duration)
@@ -491,24 +492,28 @@ def add_animation(id, start_frame, end_frame, duration, tile_set_elem):
 #    tree = ET.ElementTree(map_elem)
 #    tree.write(output_file, encoding="UTF-8", xml_declaration=True)
 
-############# Argument parser START
-parser = argparse.ArgumentParser(prog = 'lvltiled', 
-         description = "Convert level to Tiled TMX.")
+def main():
+    ############# Argument parser START
+    parser = argparse.ArgumentParser(prog = 'lvltiled', 
+             description = "Convert level to Tiled TMX.")
+
+    #filename is required
+    parser.add_argument('filename',
+                        type = str,
+                        help = 'filename of the level to be converted; e.g. level-a')
 
-#filename is required
-parser.add_argument('filename',
-                    type = str,
-                    help = 'filename of the level to be converted; e.g. level-a')
+    args = parser.parse_args()
+    ############# Argument parser END
 
-args = parser.parse_args()
-############# Argument parser END
 
+    level_data = load_map(args.filename)
 
-level_data = load_map(args.filename)
+    map_elem = generate_tmx_file(level_data, args.filename)
 
-map_elem = generate_tmx_file(level_data, args.filename)
+    rough_string = ET.tostring(map_elem, 'utf-8')
+    reparsed = xml.dom.minidom.parseString(rough_string)
+    pretty_xml = reparsed.toprettyxml(indent="  ")
+    print(pretty_xml)
 
-rough_string = ET.tostring(map_elem, 'utf-8')
-reparsed = xml.dom.minidom.parseString(rough_string)
-pretty_xml = reparsed.toprettyxml(indent="  ")
-print(pretty_xml)
+if __name__ == "__main__":
+    main()
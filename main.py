@@ -1,11 +1,127 @@
 #!/usr/bin/env python3
 import sys
-from PyQt5.QtWidgets import QApplication
-from tilemap_editor import TileMapEditor
+import time
+import argparse
+import importlib
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    editor = TileMapEditor()
-    editor.show()
-    sys.exit(app.exec_())
+START_TIME = time.perf_counter()
+
+# Imported in this order for the startup profile, each time is the cost of the new imports
+STARTUP_MODULES = ["PyQt5.QtWidgets", "map_data", "tile_manager", "ui_components", "tilemap_editor"]
+
+class StartupProfile:
+    """Times of the startup stages in ms, printed with --startup-profile"""
+    
+    def __init__(self):
+        self.stages = []
+        self.last = START_TIME
+        # Editor watched for its first paint, see watch()
+        self.editor = None
+        self.timer = None
     
+    def stage(self, name):
+        """Note the end of a startup stage"""
+        now = time.perf_counter()
+        self.stages.append((name, (now - self.last) * 1000))
+        self.last = now
+    
+    def import_modules(self):
+        """Import the editor modules, one stage each"""
+        for name in STARTUP_MODULES:
+            importlib.import_module(name)
+            self.stage(f"import {name}")
+    
+    def watch(self, editor):
+        """Report once the map is painted with the loaded tilesets"""
+        from PyQt5.QtCore import QTimer
+        from profiler import profiler
+        
+        self.editor = editor
+        profiler.set_enabled(True)
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.check)
+        self.timer.start(10)
+    
+    def check(self):
+        """Wait for the first paint of the map after the tilesets were loaded"""
+        from profiler import profiler
+        
+        loads = [span for span in profiler.spans if span[0] == "load_assets"]
+        if not loads or self.editor.assets_pending:
+            return
+        _, load_start, load_duration = loads[0]
+        load_end = load_start + load_duration
+        frames = [frame for frame in profiler.frames if frame[0] >= load_end]
+        if not frames:
+            return
+        self.timer.stop()
+        
+        show_time = self.last - profiler.start_time
+        self.stages.append(("first paint (empty window)", (load_start - show_time) * 1000))
+        for name, start, duration in profiler.spans:
+            if load_start <= start < load_end and name != "load_assets":
+                self.stages.append((f"  {name}", duration * 1000))
+        self.stages.append(("load tilesets", load_duration * 1000))
+        first_frame = frames[0]
+        self.stages.append(("first paint of the map", (first_frame[0] + first_frame[1] - load_end) * 1000))
+        self.report(first_frame[0] + first_frame[1] + profiler.start_time)
+        # Keep recording only for the profiler HUD
+        profiler.set_enabled(self.editor.profiler_cb.isChecked())
+        profiler.clear()
+    
+    def report(self, end):
+        """Print the startup stages"""
+        print("\nStartup profile (ms):")
+        for name, duration in self.stages:
+            print(f"{name:<32} {duration:8.1f}")
+        print(f"{'total':<32} {(end - START_TIME) * 1000:8.1f}")
+        print("(Python interpreter startup not included)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog = 'main',
+             description = "Tile map editor for PETSCII Robots levels.")
+    
+    parser.add_argument("levels",
+                        nargs = "*",
+                        help = "level files to open, switch between them with Ctrl+PgDown and Ctrl+PgUp; e.g. maps/level-a.PET")
+    
+    parser.add_argument("-t", "--tiles",
+                        default = "tiles",
+                        help = "tileset directory (default: tiles)")
+    
+    parser.add_argument("-v", "--view",
+                        nargs = 2,
+                        type = int,
+                        metavar = ("X", "Y"),
+                        help = "map tile shown at the top left of the map view; e.g. -v 40 20")
+    
+    parser.add_argument("--startup-profile",
+                        action = "store_true",
+                        help = "print the time of the imports and initialization steps at startup")
+    
+    startup = StartupProfile()
+    startup.import_modules()
+    from PyQt5.QtWidgets import QApplication
+    from tilemap_editor import TileMapEditor
+    
+    # Qt removes its own arguments (e.g. -platform offscreen) before the editor arguments are parsed
+    qt_argv = sys.argv if argv is None else sys.argv[:1] + list(argv)
+    app = QApplication(qt_argv)
+    args = parser.parse_args(app.arguments()[1:])
+    startup.stage("QApplication")
+    # The window is shown before the tilesets are decoded
+    editor = TileMapEditor(tileset_dir=args.tiles, defer_assets=True)
+    startup.stage("editor init")
+    if args.levels:
+        editor.set_level_files(args.levels)
+        startup.stage("load level")
+    editor.show()
+    if args.view:
+        editor.scroll_to_cell(*args.view)
+    startup.stage("show")
+    if args.startup_profile:
+        startup.watch(editor)
+    return app.exec_()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
-import copy
 import sys
+from array import array
+from collections import deque
+from contextlib import contextmanager
 #from constants import (DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT, MAP_DATA_OFFSET_LOAD,
 #                       MAP_DATA_OFFSET_SAVE, 
 #                       UNIT_TYPES_OFFSET, UNIT_X_OFFSET, 
@@ -8,128 +10,348 @@ import sys
 #                       UNIT_D_OFFSET, UNIT_H_OFFSET,
 #                       UNIT_BLOCK_SIZE)
                        
-from constants import (DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT,
-                       UNIT_TYPES_OFFSET, UNIT_X_OFFSET, 
-                       UNIT_Y_OFFSET, UNIT_A_OFFSET, 
-                       UNIT_B_OFFSET, UNIT_C_OFFSET, 
-                       UNIT_D_OFFSET, UNIT_H_OFFSET,
-                       UNIT_BLOCK_SIZE)
+from constants import (DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT, EMPTY_TILE, UNIT_LABEL_REACH,
+                       UNIT_H_OFFSET, UNIT_BLOCK_SIZE, UNDO_MEMORY_LIMIT, TABLE_SIZE)
+from unit_table import UnitTable
+from profiler import timed
+
+class UndoHistory:
+    """Stores map edits as cell deltas and evicts the oldest over budget"""
+    
+    def __init__(self, memory_limit=UNDO_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.memory_used = 0
+    
+    @staticmethod
+    def _entry_size(entry):
+        """Bytes held by one history entry"""
+        return sum(sys.getsizeof(part) for part in entry)
+    
+    def record(self, positions, old_tiles, new_tiles):
+        """Record changed cells (flat positions with old and new tile ids)"""
+        # Signed tile ids, EMPTY_TILE is -1
+        entry = (array('H', positions), array('h', old_tiles), array('h', new_tiles))
+        self.undo_stack.append(entry)
+        self.memory_used += self._entry_size(entry)
+        # A new edit invalidates everything that could be redone
+        for dropped in self.redo_stack:
+            self.memory_used -= self._entry_size(dropped)
+        self.redo_stack.clear()
+        # Forget the oldest edits once the budget is exceeded
+        while self.memory_used > self.memory_limit and len(self.undo_stack) > 1:
+            self.memory_used -= self._entry_size(self.undo_stack.popleft())
+    
+    def undo(self):
+        """Return (positions, tiles) to restore, or None if nothing to undo"""
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        return entry[0], entry[1]
+    
+    def redo(self):
+        """Return (positions, tiles) to reapply, or None if nothing to redo"""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        return entry[0], entry[2]
+    
+    def clear(self):
+        """Drop the whole history"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.memory_used = 0
+
 
 class MapData:
     """Manages the map data and provides undo/redo functionality"""
     
     def __init__(self):
-        # Initialize map with empty tiles (-1)
-        self.data = [[-1 for _ in range(DEFAULT_MAP_WIDTH)] for _ in range(DEFAULT_MAP_HEIGHT)]
+        # Initialize map with empty tiles, one byte per cell in file order (row-major)
         self.width = DEFAULT_MAP_WIDTH
         self.height = DEFAULT_MAP_HEIGHT
-        self.undo_stack = []
-        self.redo_stack = []
-        self.unit_positions = {}  # Maps unit_id to (x, y, unit_type)
+        self.tiles = bytearray(self.width * self.height)
+        # 1 for erased cells (EMPTY_TILE), their tile byte is 0 as saved
+        self.erased = bytearray(self.width * self.height)
+        self.history = UndoHistory()
+        self._transaction_depth = 0
+        self._transaction_cells = {}  # Maps flat position to tile before the batch
+        # Cells to redraw since the last take_dirty(), all_dirty for the whole map
+        self.dirty_cells = set()
+        self.all_dirty = True
+        # Positions of cells holding one of the tracked (animated) tile ids
+        self.tracked_tiles = frozenset()
+        self.tracked_cells = set()
+        self.units = UnitTable()
+        self.map_size = DEFAULT_MAP_WIDTH * DEFAULT_MAP_HEIGHT
+        # Empty map, history and level file layout
+        self.reset()
+    
+    def reset(self):
+        """Clear tiles, units, undo history and the layout of the last loaded level file"""
+        self.tiles[:] = bytes(len(self.tiles))
+        self.erased[:] = b'\x01' * len(self.erased)
+        self.history.clear()
+        self._transaction_depth = 0
+        self._transaction_cells = {}
+        self.units.clear()
+        self.mark_dirty()
+        self._rebuild_tracked_cells()
         # header 
         self.header_bytes = bytearray([0x0, 0x0])  # Default to zeros
-        self.fill_byte = 0x00
+        self.fill_byte = b'\x00'
         self.unit_offset = 0
         self.file_size = 0
-        self.map_size = DEFAULT_MAP_WIDTH * DEFAULT_MAP_HEIGHT
-        self.map_offet = 0
+        self.map_offset = 0
     
     def get_tile(self, x, y):
         """Get the tile at (x, y) coordinates"""
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.data[y][x]
-        return -1
+            return self._cell(y * self.width + x)
+        return EMPTY_TILE
+    
+    def _cell(self, position):
+        """Get the tile id of a flat cell position, EMPTY_TILE if erased"""
+        return EMPTY_TILE if self.erased[position] else self.tiles[position]
+    
+    def _write_cell(self, position, tile_id):
+        """Write a tile id or EMPTY_TILE to a flat cell position"""
+        if tile_id == EMPTY_TILE:
+            self.tiles[position] = 0
+            self.erased[position] = 1
+        else:
+            self.tiles[position] = tile_id
+            self.erased[position] = 0
+        self._track_cell(position, tile_id)
+    
+    def view(self):
+        """Get a zero-copy 2D memoryview of the tiles as saved (erased cells are 0), indexed [y, x]"""
+        return memoryview(self.tiles).cast('B', (self.height, self.width))
+    
+    def row(self, y):
+        """Get a zero-copy memoryview of one map row"""
+        return memoryview(self.tiles)[y * self.width:(y + 1) * self.width]
+    
+    def as_array(self):
+        """Get a zero-copy NumPy array of the tiles with shape (height, width)"""
+        import numpy as np  # optional, only needed by analysis scripts
+        return np.frombuffer(self.tiles, dtype=np.uint8).reshape(self.height, self.width)
     
     def set_tile(self, x, y, tile_id):
-        """Set the tile at (x, y) coordinates and return True if successful"""
+        """Set the tile at (x, y) coordinates and return True if successful
+        
+        Tile ids a level byte cannot hold (TABLE_SIZE and above) are rejected.
+        """
+        if not (0 <= tile_id < TABLE_SIZE or tile_id == EMPTY_TILE):
+            return False
         if 0 <= x < self.width and 0 <= y < self.height:
-            current = self.data[y][x]
+            position = y * self.width + x
+            current = self._cell(position)
             if current != tile_id:
-                self.push_undo()
-                self.data[y][x] = tile_id
+                if self._transaction_depth:
+                    # Keep the value from before the batch started
+                    self._transaction_cells.setdefault(position, current)
+                else:
+                    self.history.record((position,), (current,), (tile_id,))
+                self._write_cell(position, tile_id)
+                self.dirty_cells.add(position)
                 return True
         return False
     
-    def push_undo(self):
-        """Save current state to undo stack"""
-        self.undo_stack.append(copy.deepcopy(self.data))
-        self.redo_stack.clear()
+    def set_line(self, x0, y0, x1, y1, tile_id):
+        """Set the tiles on the line from (x0, y0) to (x1, y1), return True if any changed
+        
+        The cells are found with Bresenham's algorithm, all changes are one undo step.
+        """
+        changed = False
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        step_x = 1 if x0 < x1 else -1
+        step_y = 1 if y0 < y1 else -1
+        error = dx + dy
+        with self.transaction():
+            while True:
+                changed |= self.set_tile(x0, y0, tile_id)
+                if x0 == x1 and y0 == y1:
+                    break
+                error2 = 2 * error
+                if error2 >= dy:
+                    error += dy
+                    x0 += step_x
+                if error2 <= dx:
+                    error += dx
+                    y0 += step_y
+        return changed
+    
+    def replace_tiles(self, tiles):
+        """Replace all tiles with width x height tile ids (or EMPTY_TILE), as one undo step
+        
+        Cells with tile ids outside the level range keep their tile.
+        """
+        with self.transaction():
+            for position, tile_id in enumerate(tiles[:len(self.tiles)]):
+                if self._cell(position) != tile_id:
+                    self.set_tile(position % self.width, position // self.width, tile_id)
+    
+    def track_tiles(self, tile_ids):
+        """Keep an index of the cells holding any of the given tile ids"""
+        self.tracked_tiles = frozenset(tile_ids)
+        self._rebuild_tracked_cells()
+    
+    def _track_cell(self, position, tile_id):
+        """Update the tracked cell index after a cell changed"""
+        if tile_id in self.tracked_tiles:
+            self.tracked_cells.add(position)
+        else:
+            self.tracked_cells.discard(position)
+    
+    def _rebuild_tracked_cells(self):
+        """Find all cells holding a tracked tile id"""
+        self.tracked_cells = self.cells_with_tiles(self.tracked_tiles)
+    
+    def cells_with_tiles(self, tile_ids):
+        """Get the positions of all cells holding one of the given tile ids"""
+        cells = set()
+        for tile_id in tile_ids:
+            if tile_id == EMPTY_TILE:
+                continue
+            position = self.tiles.find(tile_id)
+            while position != -1:
+                if not self.erased[position]:
+                    cells.add(position)
+                position = self.tiles.find(tile_id, position + 1)
+        return cells
+    
+    def tracked_cells_in_rect(self, x, y, width, height):
+        """Get the tracked cell positions inside a map rectangle"""
+        return [position for position in self.tracked_cells
+                if x <= position % self.width < x + width
+                and y <= position // self.width < y + height]
+    
+    def mark_dirty(self, positions=None):
+        """Mark flat cell positions for redraw, None marks the whole map"""
+        if positions is None:
+            self.all_dirty = True
+        else:
+            self.dirty_cells.update(positions)
+    
+    def take_dirty(self):
+        """Get the cells changed since the last call, or None if all changed
+        
+        Cells of changed units are included together with the tiles
+        their labels reach.
+        """
+        unit_cells = self.units.take_changes()
+        if self.all_dirty or unit_cells is None:
+            self.all_dirty = False
+            self.dirty_cells = set()
+            return None
+        
+        dirty = self.dirty_cells
+        self.dirty_cells = set()
+        for x, y in unit_cells:
+            if 0 <= y < self.height:
+                for label_x in range(max(0, x - UNIT_LABEL_REACH),
+                                     min(self.width, x + UNIT_LABEL_REACH + 1)):
+                    dirty.add(y * self.width + label_x)
+        return dirty
+    
+    def begin_transaction(self):
+        """Start collecting tile changes into a single undo step"""
+        self._transaction_depth += 1
+    
+    def commit_transaction(self):
+        """Close the current batch and return True if the map changed"""
+        if not self._transaction_depth:
+            return False
+        self._transaction_depth -= 1
+        if self._transaction_depth:
+            return False  # Nested batch, the outermost one records
+        
+        positions, old_tiles, new_tiles = [], [], []
+        for position, old_tile in self._transaction_cells.items():
+            new_tile = self._cell(position)
+            # Cells painted over and back again are not a change
+            if new_tile != old_tile:
+                positions.append(position)
+                old_tiles.append(old_tile)
+                new_tiles.append(new_tile)
+        self._transaction_cells = {}
+        
+        if positions:
+            self.history.record(positions, old_tiles, new_tiles)
+            return True
+        return False
+    
+    def in_transaction(self):
+        """Check if a batch of edits is open"""
+        return self._transaction_depth > 0
+    
+    @contextmanager
+    def transaction(self):
+        """Group all tile changes made in the block into one undo step"""
+        self.begin_transaction()
+        try:
+            yield self
+        finally:
+            self.commit_transaction()
+    
+    def _apply_cells(self, positions, tiles):
+        """Write tiles to flat cell positions"""
+        for position, tile_id in zip(positions, tiles):
+            self._write_cell(position, tile_id)
+        self.dirty_cells.update(positions)
     
     def undo(self):
-        """Restore previous state from undo stack"""
-        if self.undo_stack:
-            self.redo_stack.append(copy.deepcopy(self.data))
-            self.data = self.undo_stack.pop()
+        """Restore previous state from undo history"""
+        change = self.history.undo()
+        if change:
+            self._apply_cells(*change)
             return True
         return False
     
     def redo(self):
-        """Restore next state from redo stack"""
-        if self.redo_stack:
-            self.undo_stack.append(copy.deepcopy(self.data))
-            self.data = self.redo_stack.pop()
+        """Restore next state from redo history"""
+        change = self.history.redo()
+        if change:
+            self._apply_cells(*change)
             return True
         return False
     
-    def save_binary(self, filepath):
-        """Save map to binary file format"""
+    @timed("save_binary")
+    def save_binary(self, filepath, verbose=True):
+        """Save map to binary file format, only a loaded level (known format) is saved"""
+        if not self.map_offset:
+            print("No level loaded, the level format is unknown. Map not saved.")
+            return False
         try:
             # PETSCII Robots format with units
-            #bytes_to_write = bytearray(770 + 128 * 64)  # Initialize with zeros
-            #bytes_to_write = bytearray([FILL_VALUE] * (MAP_DATA_OFFSET_SAVE + 128 * 64)) 
             # fill byte array with fill byte (0x00, 0xAA or "nothing")
-            #FILL_VALUE = self.fill_byte[0] 
-            #bytes_to_write = bytearray([FILL_VALUE] * (MAP_DATA_OFFSET_SAVE + 128 * 64)) 
-            bytes_to_write = bytearray([self.fill_byte[0]] * (self.map_offset + self.map_size)) 
-            
+            bytes_to_write = bytearray(self.fill_byte[0:1]) * (self.map_offset + self.map_size)
             
             # Write the header bytes first
             bytes_to_write[0x0:0x02] = self.header_bytes
-            #print(self.header_bytes)
-            # Write unit data
-              # Write unit data
-            for i in range(UNIT_BLOCK_SIZE):
-                # If the unit exists in our dictionary, use its data
-                if i in self.unit_positions:
-                    x, y, unit_type, a, b, c, d, h = self.unit_positions[i]
-                    bytes_to_write[UNIT_TYPES_OFFSET + self.unit_offset + i] = unit_type
-                    bytes_to_write[UNIT_X_OFFSET + self.unit_offset + i] = x
-                    bytes_to_write[UNIT_Y_OFFSET + self.unit_offset + i] = y
-                    bytes_to_write[UNIT_A_OFFSET + self.unit_offset + i] = a
-                    bytes_to_write[UNIT_B_OFFSET + self.unit_offset + i] = b
-                    bytes_to_write[UNIT_C_OFFSET + self.unit_offset + i] = c
-                    bytes_to_write[UNIT_D_OFFSET + self.unit_offset + i] = d
-                    bytes_to_write[UNIT_H_OFFSET + self.unit_offset + i] = h
-                # If the unit doesn't exist, write fill bytes
-                else:
-                    bytes_to_write[UNIT_TYPES_OFFSET + self.unit_offset + i] = 0
-                    bytes_to_write[UNIT_X_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_Y_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_A_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_B_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_C_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_D_OFFSET + self.unit_offset + i]     = 0
-                    bytes_to_write[UNIT_H_OFFSET + self.unit_offset + i]     = 0
+            
+            # Write unit data, one 64-byte column per property.
+            # Units that don't exist are written as zeros
+            self.units.save_columns(bytes_to_write, self.unit_offset)
             # otherwise there will be a 01 in the beginning of the level if the values
             # of the player have been changed 
             if self.unit_offset == 2:
                 bytes_to_write[0x0:0x02] = self.header_bytes
             
-            # Write map data
-            for y in range(min(self.height, 64)):
-                for x in range(min(self.width, 128)):
-                    # Convert -1 (empty) to 0 
-                    tile = self.data[y][x]
-                    if tile == -1:
-                        tile = 0
-                    ##### offset!!! depends on device!! 770 PET, 770-128-128 X16 
-                    #bytes_to_write[MAP_DATA_OFFSET_SAVE + y * 128 + x] = tile & 0xFF
-                    bytes_to_write[self.map_offset + y * 128 + x] = tile & 0xFF
+            # Write map data in one block, empty cells are 0 in tiles
+            ##### offset!!! depends on device!! 770 PET, 770-128-128 X16 
+            bytes_to_write[self.map_offset:self.map_offset + self.map_size] = self.tiles
             
             with open(filepath, 'wb') as f:
                 f.write(bytes_to_write)
             
-            print(f"\nLevel data saved to {filepath}.")
+            if verbose:
+                print(f"\nLevel data saved to {filepath}.")
             
             return True
             
@@ -137,125 +359,86 @@ class MapData:
             print(f"Error saving binary map: {e}")
             return False
     
-    def load_binary(self, filepath):
-        """Load map from binary file format"""
+    @timed("load_binary")
+    def load_binary(self, filepath, verbose=True):
+        """Load map from binary file format
+        
+        The current map, units and undo history are replaced, the map is kept
+        if the file cannot be read or is not a level.
+        """
+        # Batch scripts can switch off the level report
+        log = print if verbose else (lambda *args: None)
         
         try:
             with open(filepath, 'rb') as f:
                 binary_data = f.read()
-            # Reset map data
-            #self.data = [[-1 for _ in range(self.width)] for _ in range(self.height)]
-            #self.unit_positions = {}
+            view = memoryview(binary_data)
+            header_bytes = binary_data[0x0:0x2]
+            file_size = len(binary_data)
+            
+            #try to determine the level structure 
+            if header_bytes[0:1] == b'\x01' and file_size == 8960:
+                log("\nThis is probably a level for the Amiga or MS-DOS.")
+            elif header_bytes[1:2] == b'\x5D' and file_size == 8962:
+                log("\nThis is probably a level for the PET, C64 or C128.")
+            elif file_size == 8706:
+                log("\nThis is probably a level for the X16.")
+            else:
+                print("\nUnknown level architecture.")
+                print(f"First bytes: {header_bytes[0:2].hex().upper()}")
+                print(f"File size  : {file_size}")
+                return False
+            # The unit data starts with the player (unit type 1)
+            unit_offset = binary_data.find(0x01)
+            if unit_offset == -1:
+                print("\nNo player unit found, this is not a level.")
+                return False
+            
+            # A new level, nothing of the last one is kept
+            self.reset()
             #header
-            self.header_bytes = binary_data[0x0:0x2]
-            #print(self.header_bytes)
+            self.header_bytes = header_bytes
+            self.file_size = file_size
+            self.map_offset = self.file_size - self.map_size
             # Extract unit data
-            #UNIT_TYPES_OFFSET = UNIT_TYPES_OFFSET + BASE_ADDRESS 
-            #UNIT_X_OFFSET = UNIT_X_OFFSET + BASE_ADDRESS
-            #UNIT_Y_OFFSET = UNIT_Y_OFFSET + BASE_ADDRESS
-            #UNIT_A_OFFSET = UNIT_A_OFFSET + BASE_ADDRESS
-            #UNIT_B_OFFSET = UNIT_B_OFFSET + BASE_ADDRESS
-            #UNIT_C_OFFSET = UNIT_C_OFFSET + BASE_ADDRESS
-            #UNIT_D_OFFSET = UNIT_D_OFFSET + BASE_ADDRESS
-            #UNIT_H_OFFSET = UNIT_H_OFFSET + BASE_ADDRESS
-            while binary_data[self.unit_offset] !=0x01:
-                self.unit_offset += 1
-                            
-            unit_types = binary_data[UNIT_TYPES_OFFSET + self.unit_offset:UNIT_TYPES_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_xs = binary_data[UNIT_X_OFFSET + self.unit_offset:UNIT_X_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_ys = binary_data[UNIT_Y_OFFSET + self.unit_offset:UNIT_Y_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_a = binary_data[UNIT_A_OFFSET + self.unit_offset:UNIT_A_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_b = binary_data[UNIT_B_OFFSET + self.unit_offset:UNIT_B_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_c = binary_data[UNIT_C_OFFSET + self.unit_offset:UNIT_C_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_d = binary_data[UNIT_D_OFFSET + self.unit_offset:UNIT_D_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
-            unit_h = binary_data[UNIT_H_OFFSET + self.unit_offset:UNIT_H_OFFSET + self.unit_offset + UNIT_BLOCK_SIZE]
+            self.unit_offset = unit_offset
+            self.units.load_columns(view, self.unit_offset)
             # get the fill byte which is either 0xAA or 0x00 or "nothing" (X16 version)
             self.fill_byte = binary_data[UNIT_H_OFFSET + UNIT_BLOCK_SIZE + self.unit_offset:UNIT_H_OFFSET + UNIT_BLOCK_SIZE + self.unit_offset + 1]
             
             # Process units
-            for i in range(UNIT_BLOCK_SIZE):
-                x = unit_xs[i]
-                y = unit_ys[i]
-                t = unit_types[i]
-                a = unit_a[i]
-                b = unit_b[i]
-                c = unit_c[i]
-                d = unit_d[i]
-                h = unit_h[i]
-
-                self.unit_positions[i] = (x, y, t, a, b, c, d, h)
-                if t == 1:
-                    print(f"Player (Unit {i}): Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
-                    #self.unit_positions[0] = (x, y, t, a, b, c, d, h)  # Assign player to Unit 0
-                else:
-                    print(f"Unit {i}: Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
-                
-                #if x < 128 and y < 64 and t != 0:
-                #    self.unit_positions[i] = (x, y, t, a, b, c, d, h)
-                #    if t == 1:
-                #        print(f"Player (Unit {i}): Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
-                #        self.unit_positions[0] = (x, y, t, a, b, c, d, h)  # Assign player to Unit 0
-                #    else:
-                #        print(f"Unit {i}: Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
+            if verbose:
+                for i, (x, y, t, a, b, c, d, h) in self.units.items():
+                    if t == 1:
+                        print(f"Player (Unit {i}): Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
+                    else:
+                        print(f"Unit {i}: Position ({x}, {y}), Type: {t}, A: {a}, B: {b}, C: {c}, D: {d}, Health: {h}")
             
-            self.file_size = len(binary_data)
-            self.map_offset = self.file_size - self.map_size
-            #print(self.unit_offset + 512 + 128 * 64 - self.file_size - 512 - self.unit_offset)
-            #print(self.file_size - 128 * 64)
             # get the first byte of the map
-            #first_map_byte = binary_data[MAP_DATA_OFFSET_LOAD + self.unit_offset:MAP_DATA_OFFSET_LOAD + self.unit_offset + 1]
-            #first_map_byte = binary_data[MAP_DATA_OFFSET_LOAD + self.unit_offset:MAP_DATA_OFFSET_LOAD + self.unit_offset + 1]
             first_map_byte = binary_data[self.map_offset + self.unit_offset:self.map_offset + self.unit_offset + 1]
             # if it is equal to self.fill_byte than there is no fill byte or offset is wrong
             
-            #try to determine the level structure 
-            if self.header_bytes[0] == 0x01 and self.file_size == 8960:
-                print("\nThis is probably a level for the Amiga or MS-DOS.")
-                print(f"First bytes: {self.header_bytes[0:2].hex().upper()}")
-                print(f"File size  : {self.file_size}")
-                print(f"Map offset : {self.map_offset}")
-            elif self.header_bytes[1] == 0x5D and self.file_size == 8962:
-                print("\nThis is probably a level for the PET, C64 or C128.")
-                print(f"First bytes: {self.header_bytes[0:2].hex().upper()}")
-                print(f"File size  : {self.file_size}")
-                print(f"Map offset : {self.map_offset}")
-            elif self.file_size == 8706:
-                print("\nThis is probably a level for the X16.")
-                print(f"First bytes: {self.header_bytes[0:2].hex().upper()}")
-                print(f"File size  : {self.file_size}")
-                print(f"Map offset : {self.map_offset}")
-            else:
-                print("\nUnknown level architecture. Exit.")
-                print(f"First bytes: {self.header_bytes[0:2].hex().upper()}")
-                print(f"File size  : {self.file_size}")
-                print(f"Map offset : {self.map_offset}")
-                sys.exit(1)
+            log(f"First bytes: {self.header_bytes[0:2].hex().upper()}")
+            log(f"File size  : {self.file_size}")
+            log(f"Map offset : {self.map_offset}")
                 
             if first_map_byte == self.fill_byte:
-                print("\nFill Byte: None")
-                print("\nExcept for the X16 version, the fill byte should be not 'None'.")
+                log("\nFill Byte: None")
+                log("\nExcept for the X16 version, the fill byte should be not 'None'.")
             else:
-                print(f"\nFill Byte: {self.fill_byte.hex().upper()}")
+                log(f"\nFill Byte: {self.fill_byte.hex().upper()}")
                 
-            # Process map tiles
-            print("\n--- Loading Map Tiles ---")
-            #index = MAP_DATA_OFFSET_LOAD
-            index = self.map_offset
-            for y in range(self.height):
-                for x in range(self.width):
-                    if index < len(binary_data):
-                        tile_value = binary_data[index]
-                        #if tile_value > 0:
-                        if tile_value >= 0:
-                            self.data[y][x] = tile_value
-                    index += 1
+            # Process map tiles, the map block is copied as a whole
+            log("\n--- Loading Map Tiles ---")
+            self.tiles[:] = view[self.map_offset:self.map_offset + self.map_size]
+            self.erased[:] = bytes(len(self.erased))
+            self._rebuild_tracked_cells()
             
             # Map info
-            print(f"\nMap size: {self.width}x{self.height}")
-            #print(f"Map data starts at offset: {MAP_DATA_OFFSET_LOAD}")
-            print(f"Map data starts at offset: {self.map_offset}")
-            print(f"Expected map size: {self.width * self.height} bytes")
-            print(f"Actual data after offset: {self.file_size - self.map_offset} bytes")
+            log(f"\nMap size: {self.width}x{self.height}")
+            log(f"Map data starts at offset: {self.map_offset}")
+            log(f"Expected map size: {self.width * self.height} bytes")
+            log(f"Actual data after offset: {self.file_size - self.map_offset} bytes")
             
             return True
         except IOError as e:
@@ -0,0 +1,257 @@
+# map renderer
+from PyQt5.QtGui import QImage, QPainter, QColor, QFont
+from PyQt5.QtCore import Qt, QPointF, QRect
+
+from constants import TILE_SIZE, GRID_COLOR, UNIT_LABEL_REACH
+from constants import PLAYER_COLOR, ROBOT_COLOR, DOOR_COLOR, ITEM_COLOR
+from profiler import timed
+
+class MapRenderer:
+    """Draws map tiles, grid and unit overlay with a QPainter
+    
+    Drawing coordinates start at the top left cell of the view window
+    (window_x, window_y). MapCanvasWidget draws the part of the map on screen,
+    render_map() the whole map into an image.
+    """
+    
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.window_x = 0  # View window position
+        self.window_y = 0
+        self.window_width = 0
+        self.window_height = 0
+        self.map_data = None
+        self.tile_manager = None
+        self.units = None
+        self.show_animations = True
+        self.show_unit_overlay = True
+        self.show_grid = True
+    
+    def draw_filled_rectangle_with_border(self, painter, x, y, width, height, fill_color, border_color, alpha=128):
+        """Draw a rectangle with semi-transparent fill and border"""
+        # Set up semi-transparent fill color
+        fill = QColor(fill_color)
+        fill.setAlpha(alpha)
+        
+        # Fill the rectangle
+        painter.fillRect(x, y, width, height, fill)
+        
+        # Draw the border
+        painter.setPen(QColor(border_color))
+        painter.drawRect(x, y, width, height)
+    
+    def draw_filled_ellipse_with_border(self, painter, x, y, width, height, fill_color, border_color, alpha=128):
+        """Draw an ellipse with semi-transparent fill and border"""
+        # Save current brush and pen
+        old_brush = painter.brush()
+        old_pen = painter.pen()
+        
+        # Set up semi-transparent fill
+        fill = QColor(fill_color)
+        fill.setAlpha(alpha)
+        painter.setBrush(fill)
+        
+        # Set up border
+        painter.setPen(QColor(border_color))
+        
+        # Draw the ellipse
+        painter.drawEllipse(x, y, width, height)
+        
+        # Restore original brush and pen
+        painter.setBrush(old_brush)
+        painter.setPen(old_pen)
+    
+    def draw_centered_text(self, painter, x, y, width, height, text, text_color=Qt.white, font_size_adjustment=0):
+        """Draw text centered in the given rectangle with the specified styling
+        
+        Args:
+            painter: QPainter object
+            x, y: Top-left corner of the rectangle to center text in
+            width, height: Dimensions of the rectangle
+            text: Text to display
+            text_color: Color for the text (default: white)
+            font_size_adjustment: Adjustment to font size (default: -2)
+        """
+        # Save original font
+        original_font = painter.font()
+        
+        # Create a smaller font
+        smaller_font = QFont(original_font)
+        if font_size_adjustment != 0:
+            smaller_font.setPointSize(max(6, original_font.pointSize() + font_size_adjustment))
+        
+        # Apply the font
+        painter.setFont(smaller_font)
+        
+        # Set text color
+        painter.setPen(text_color)
+        
+        # Calculate centered position
+        text_width = painter.fontMetrics().horizontalAdvance(text)
+        text_height = painter.fontMetrics().height()
+        
+        text_x = x + (width - text_width) / 2
+        text_y = y + (height + text_height) / 2 - 2  # -2 for visual adjustment
+        
+        # Draw the text
+        painter.drawText(int(text_x), int(text_y), text)
+        
+        # Restore original font
+        painter.setFont(original_font)
+    
+    def _draw_rect(self, painter, rect):
+        """Draw all cells intersecting a rectangle in widget coordinates"""
+        first_x = max(0, rect.left() // self.tile_size)
+        first_y = max(0, rect.top() // self.tile_size)
+        last_x = min(self.window_width - 1, rect.right() // self.tile_size)
+        last_y = min(self.window_height - 1, rect.bottom() // self.tile_size)
+        
+        painter.fillRect(rect, Qt.white)
+        
+        # Draw tiles, one batch per row and atlas
+        for y in range(first_y, last_y + 1):
+            self._draw_tile_row(painter, y, first_x, last_x)
+        
+        # Draw grid
+        if self.show_grid:
+            painter.setPen(QColor(*GRID_COLOR))
+            top = first_y * self.tile_size
+            bottom = (last_y + 1) * self.tile_size
+            left = first_x * self.tile_size
+            right = (last_x + 1) * self.tile_size
+            for x in range(first_x, last_x + 2):
+                painter.drawLine(x * self.tile_size, top, x * self.tile_size, bottom)
+            for y in range(first_y, last_y + 2):
+                painter.drawLine(left, y * self.tile_size, right, y * self.tile_size)
+        
+        # Draw units, labels of units next to the rectangle can reach into it
+        self._draw_units(painter, self.units,
+                         first_x + self.window_x - UNIT_LABEL_REACH, first_y + self.window_y,
+                         last_x - first_x + 1 + 2 * UNIT_LABEL_REACH, last_y - first_y + 1)
+    
+    @timed("draw_tiles")
+    def _draw_tile_row(self, painter, y, first_x, last_x):
+        """Draw the tiles of screen row y from first_x to last_x"""
+        map_data = self.map_data
+        map_y = y + self.window_y
+        if map_y >= map_data.height:
+            return
+        
+        row_start = map_y * map_data.width
+        half = self.tile_size / 2
+        center_y = y * self.tile_size + half
+        # Sources of all tile ids in their current animation frame
+        source_table = self.tile_manager.source_table(self.show_animations)
+        fragments = ([], [])  # Per atlas: TILES_ATLAS, ANIM_ATLAS
+        for x in range(first_x, min(last_x + 1, map_data.width - self.window_x)):
+            # Get tile ID at this position, erased cells stay blank
+            position = row_start + x + self.window_x
+            tile_id = map_data.tiles[position]
+            if not map_data.erased[position]:
+                # Get the atlas rect for this tile (considering animation)
+                source = source_table[tile_id]
+                if source:
+                    atlas_index, rect = source
+                    fragments[atlas_index].append(QPainter.PixmapFragment.create(
+                        QPointF(x * self.tile_size + half, center_y), rect))
+        
+        for atlas_index, atlas_fragments in enumerate(fragments):
+            if atlas_fragments:
+                painter.drawPixmapFragments(atlas_fragments, self.tile_manager.atlas(atlas_index))
+    
+    @timed("draw_units")
+    def _draw_units(self, painter, units, map_x, map_y, width, height):
+        """Draw an overlay showing unit positions inside a map rectangle"""
+        if not self.show_unit_overlay:
+            return
+        for unit_id in units.ids_in_rect(map_x, map_y, width, height):
+            x, y, unit_type, a, b, c, d, h = units.get(unit_id)
+            # Adjust for the view window position
+            screen_x = (x - self.window_x) * self.tile_size
+            screen_y = (y - self.window_y) * self.tile_size
+            
+            # Different styles for different unit types
+            if unit_type == 1:  # Player
+                fill_color = QColor(PLAYER_COLOR)  
+                fill_color.setAlpha(128)
+                painter.fillRect(screen_x + 2, screen_y + 2, 
+                                self.tile_size - 4, self.tile_size - 4, fill_color)
+                self.draw_centered_text(
+                painter,
+                screen_x, screen_y,
+                self.tile_size, self.tile_size, f"P{unit_id}-{unit_type}") 
+                #painter.drawText(screen_x + 5 + 17, screen_y + 16, f"P{unit_id}-{unit_type}")
+            #elif 1 <= unit_id <= 27:  # Robots
+            elif unit_type in [2, 3, 4, 9, 17, 18]:  # Robots
+            #elif 3 <= unit_id <= 3 + 26:  # Robots
+                #painter.setPen(QColor(ROBOT_COLOR))
+                fill_color = QColor(ROBOT_COLOR)  
+                fill_color.setAlpha(128)
+                painter.fillRect(screen_x + 2, screen_y + 2, 
+                                self.tile_size - 4, self.tile_size - 4, fill_color)
+                self.draw_centered_text(
+                painter,
+                screen_x, screen_y,
+                self.tile_size, self.tile_size, f"R{unit_id}-{unit_type}") 
+                #painter.drawText(screen_x + 5 + 17, screen_y + 16, f"R{unit_id-3}-{unit_type}")
+            #elif 32 <= unit_id <= 47:  # Doors
+            elif unit_type in [7, 10, 16, 19, 22]: # Doors and transport
+            #elif 34 <= unit_id <= 34 + 15:  # Door
+                #painter.setPen(QColor(DOOR_COLOR))
+                fill_color = QColor(DOOR_COLOR)  
+                fill_color.setAlpha(128)
+                painter.fillRect(screen_x + 2, screen_y + 2, 
+                                self.tile_size - 4, self.tile_size - 4, fill_color)
+                self.draw_centered_text(
+                painter,
+                screen_x, screen_y,
+                self.tile_size, self.tile_size, f"D{unit_id}-{unit_type}-{c}") 
+            #elif 48 <= unit_id <= 63:  # Items
+            elif unit_type in [128, 129, 130, 131, 132, 133, 134]: # Items
+            #elif 50 <= unit_id <= 50 + 15:  # Items
+                #painter.setPen(QColor(ITEM_COLOR))
+                #painter.drawEllipse(screen_x + 4, screen_y + 4, 
+                #                  self.tile_size - 8, self.tile_size - 8)
+                fill_color = QColor(ITEM_COLOR)  
+                fill_color.setAlpha(128)
+                painter.fillRect(screen_x + 2, screen_y + 2, 
+                                self.tile_size - 4, self.tile_size - 4, fill_color)
+                if unit_type == 128:
+                # if key
+                     self.draw_centered_text(
+                    painter,
+                    screen_x, screen_y,
+                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}-{a}")
+                elif 128 < unit_type <= 134:
+                # if weapon or item
+                    self.draw_centered_text(
+                    painter,
+                    screen_x, screen_y,
+                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}-{a}")
+                else:
+                    self.draw_centered_text(
+                    painter,
+                    screen_x, screen_y,
+                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}")
+                
+                
+                #painter.drawText(screen_x + 5, screen_y + 16, f"I{unit_id-51}-{unit_type}")
+
+def render_map(map_data, tile_manager, show_units=True, show_grid=True, show_animations=False):
+    """Render a whole map into an image, animated tiles in their first frame if shown"""
+    renderer = MapRenderer(tile_manager.tile_size)
+    renderer.map_data = map_data
+    renderer.tile_manager = tile_manager
+    renderer.units = map_data.units
+    renderer.show_animations = show_animations
+    renderer.show_unit_overlay = show_units
+    renderer.show_grid = show_grid
+    renderer.window_width = map_data.width
+    renderer.window_height = map_data.height
+    
+    image = QImage(map_data.width * renderer.tile_size, map_data.height * renderer.tile_size,
+                   QImage.Format_RGB32)
+    painter = QPainter(image)
+    renderer._draw_rect(painter, QRect(0, 0, image.width(), image.height()))
+    painter.end()
+    return image
@@ -0,0 +1,205 @@
+# profiler
+import os
+import sys
+import time
+from collections import deque
+from functools import wraps
+
+from constants import PROFILER_MAX_SPANS, PROFILER_WINDOW, PROFILER_INPUT_TIMEOUT
+
+class Profiler:
+    """Timing spans of the editor hot paths, frame rate, input latency and allocations
+    
+    Nothing is recorded until the profiler is enabled, instrumented functions
+    only check a flag. A frame is one paint of the map canvas: its duration,
+    the latency from the oldest input event not painted yet, and the number of
+    memory blocks allocated while painting (sys.getallocatedblocks) are kept.
+    """
+    
+    def __init__(self, max_spans=PROFILER_MAX_SPANS):
+        self.enabled = False
+        self.start_time = time.perf_counter()
+        # (name, start, duration) in seconds since start_time
+        self.spans = deque(maxlen=max_spans)
+        # (start, duration, input latency or None, allocated blocks)
+        self.frames = deque(maxlen=max_spans)
+        self.frame_start = None
+        self.frame_blocks = 0
+        # Time of the oldest input event not painted yet
+        self.input_time = None
+        # cProfile of a single interaction: output file, armed until the next input
+        self.capture_path = None
+        self.capture = None
+    
+    def set_enabled(self, enabled):
+        """Start or stop recording"""
+        self.enabled = enabled
+        self.frame_start = None
+        self.input_time = None
+        if not enabled:
+            self.cancel_capture()
+    
+    def clear(self):
+        """Drop all recorded spans and frames"""
+        self.start_time = time.perf_counter()
+        self.spans.clear()
+        self.frames.clear()
+        self.frame_start = None
+        self.input_time = None
+    
+    def now(self):
+        """Get the time in seconds since start_time"""
+        return time.perf_counter() - self.start_time
+    
+    def add_span(self, name, start, end):
+        """Record a span between two perf_counter() times"""
+        self.spans.append((name, start - self.start_time, end - start))
+    
+    def mark_input(self):
+        """Note an input event, its latency is measured with the next frame"""
+        if not self.enabled:
+            return
+        now = self.now()
+        # An input older than the timeout was not painted, it changed nothing
+        if self.input_time is None or (now - self.input_time) * 1000 > PROFILER_INPUT_TIMEOUT:
+            self.input_time = now
+        if self.capture_path and self.capture is None:
+            import cProfile
+            self.capture = cProfile.Profile()
+            self.capture.enable()
+    
+    def begin_frame(self):
+        """Start timing a paint of the canvas"""
+        if self.enabled:
+            self.frame_blocks = sys.getallocatedblocks()
+            self.frame_start = time.perf_counter()
+    
+    def end_frame(self):
+        """Finish timing a paint of the canvas"""
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        blocks = sys.getallocatedblocks() - self.frame_blocks
+        start = self.frame_start - self.start_time
+        self.frame_start = None
+        
+        latency = None
+        if self.input_time is not None:
+            latency = end - self.start_time - self.input_time
+            self.input_time = None
+            # Inputs that changed nothing are not reported with a later frame
+            if latency * 1000 > PROFILER_INPUT_TIMEOUT:
+                latency = None
+        self.frames.append((start, end - self.start_time - start, latency, blocks))
+        
+        if self.capture is not None:
+            self.finish_capture()
+    
+    def capture_next(self, path):
+        """Profile the next interaction with cProfile, from its input event to its frame"""
+        self.cancel_capture()
+        self.capture_path = path
+    
+    def cancel_capture(self):
+        """Stop a cProfile capture without saving it"""
+        if self.capture is not None:
+            self.capture.disable()
+        self.capture = None
+        self.capture_path = None
+    
+    def finish_capture(self):
+        """Stop the cProfile capture, save it and print the top functions"""
+        import pstats
+        
+        self.capture.disable()
+        stats = pstats.Stats(self.capture)
+        try:
+            stats.dump_stats(self.capture_path)
+            print(f"\nProfile of one interaction saved to {self.capture_path}.")
+        except OSError as e:
+            print(f"Error saving profile '{self.capture_path}': {e}")
+        stats.sort_stats("cumulative").print_stats(15)
+        self.capture = None
+        self.capture_path = None
+    
+    def summary(self, window=PROFILER_WINDOW):
+        """Get the statistics of the last window seconds
+        
+        Returns a dict with fps, frame (mean, max ms), latency (mean, max ms or None),
+        blocks (mean allocated blocks per frame) and spans (name -> count, mean, max ms).
+        """
+        since = self.now() - window
+        # Spans and frames are recorded in the order they end
+        frames = []
+        for frame in reversed(self.frames):
+            if frame[0] + frame[1] < since:
+                break
+            frames.append(frame)
+        durations = [frame[1] * 1000 for frame in frames]
+        latencies = [frame[2] * 1000 for frame in frames if frame[2] is not None]
+        
+        spans = {}
+        for name, start, duration in reversed(self.spans):
+            if start + duration < since:
+                break
+            spans.setdefault(name, []).append(duration * 1000)
+        
+        return {
+            "fps": len(frames) / window,
+            "frame": (sum(durations) / len(durations), max(durations)) if durations else (0, 0),
+            "latency": (sum(latencies) / len(latencies), max(latencies)) if latencies else None,
+            "blocks": sum(frame[3] for frame in frames) / len(frames) if frames else 0,
+            "spans": {name: (len(times), sum(times) / len(times), max(times))
+                      for name, times in sorted(spans.items())},
+        }
+    
+    def export_csv(self, path):
+        """Write all spans and frames to a CSV file (times in ms)"""
+        import csv
+        
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "start_ms", "duration_ms", "latency_ms", "allocated_blocks"])
+            rows = [(start, name, duration, None, None) for name, start, duration in self.spans]
+            rows += [(start, "frame", duration, latency, blocks)
+                     for start, duration, latency, blocks in self.frames]
+            for start, name, duration, latency, blocks in sorted(rows, key=lambda row: row[0]):
+                writer.writerow([name, f"{start * 1000:.3f}", f"{duration * 1000:.3f}",
+                                 "" if latency is None else f"{latency * 1000:.3f}",
+                                 "" if blocks is None else blocks])
+    
+    def export_chrome_trace(self, path):
+        """Write all spans and frames as Chrome trace events (chrome://tracing, Perfetto)"""
+        import json
+        
+        pid = os.getpid()
+        events = [{"name": name, "cat": "editor", "ph": "X", "pid": pid, "tid": 0,
+                   "ts": round(start * 1e6, 1), "dur": round(duration * 1e6, 1)}
+                  for name, start, duration in self.spans]
+        for start, duration, latency, blocks in self.frames:
+            args = {"allocated_blocks": blocks}
+            if latency is not None:
+                args["latency_ms"] = round(latency * 1000, 3)
+            events.append({"name": "frame", "cat": "frame", "ph": "X", "pid": pid, "tid": 1,
+                           "ts": round(start * 1e6, 1), "dur": round(duration * 1e6, 1),
+                           "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+# The profiler of the editor
+profiler = Profiler()
+
+def timed(name):
+    """Decorator recording every call of a function as a span while profiling"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add_span(name, start, time.perf_counter())
+        return wrapper
+    return decorate
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# render level previews without opening windows
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Qt draws into images only, no display is needed
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from constants import TILE_SIZE, LEVEL_FILE_SIZES
+
+# Set by init_worker in every worker process
+worker_app = None
+worker_tiles = None
+
+def find_levels(paths):
+    """Get the level files of the given files and directories (searched recursively)
+    
+    Returns (path, path relative to the searched directory) pairs, level files
+    in directories are recognized by their size.
+    """
+    levels = []
+    for path in paths:
+        if os.path.isfile(path):
+            levels.append((path, os.path.basename(path)))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if os.path.getsize(file_path) in LEVEL_FILE_SIZES:
+                    levels.append((file_path, os.path.relpath(file_path, path)))
+    return levels
+
+def find_tileset(tileset_dir, tileset=None):
+    """Get the tileset file to render with, tiles.png or the first PNG file by default"""
+    try:
+        tileset_files = sorted(f for f in os.listdir(tileset_dir) if f.endswith(".png"))
+    except OSError:
+        tileset_files = []
+    if tileset is None and tileset_files:
+        tileset = "tiles.png" if "tiles.png" in tileset_files else tileset_files[0]
+    if tileset not in tileset_files:
+        return None
+    return tileset
+
+def init_worker(tileset_dir, tileset):
+    """Create the Qt application and load the tilesets of a worker process"""
+    global worker_app, worker_tiles
+    from PyQt5.QtGui import QGuiApplication
+    from tile_manager import TileManager
+    
+    worker_app = QGuiApplication.instance() or QGuiApplication(["render_levels"])
+    worker_tiles = TileManager(TILE_SIZE)
+    worker_tiles.tileset_dir = tileset_dir
+    worker_tiles.load_tileset(tileset)
+    worker_tiles.load_animated_tileset()
+
+def render_level(path, output, show_units, show_grid, show_animations, scale):
+    """Render a level file to a PNG file, returns (path, output, error, time in ms)"""
+    from PyQt5.QtCore import Qt
+    from map_data import MapData
+    from map_renderer import render_map
+    
+    start = time.perf_counter()
+    map_data = MapData()
+    if not map_data.load_binary(path, verbose=False):
+        return path, output, "cannot read level", 0
+    
+    image = render_map(map_data, worker_tiles, show_units, show_grid, show_animations)
+    if scale != 1:
+        image = image.scaled(max(1, round(image.width() * scale)), max(1, round(image.height() * scale)),
+                             Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    if not image.save(output, "PNG"):
+        return path, output, "cannot write image", 0
+    return path, output, None, (time.perf_counter() - start) * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog = 'render_levels',
+             description = "Render levels to PNG images without opening windows.")
+    
+    parser.add_argument("levels",
+                        nargs = "+",
+                        help = "level files or directories with level files; e.g. maps")
+    
+    parser.add_argument("-o", "--output",
+                        default = "previews",
+                        help = "directory of the PNG files (default: previews)")
+    
+    parser.add_argument("-t", "--tiles",
+                        default = "tiles",
+                        help = "tileset directory (default: tiles)")
+    
+    parser.add_argument("--tileset",
+                        help = "tileset file in the tileset directory (default: tiles.png)")
+    
+    parser.add_argument("-u", "--units",
+                        action = "store_true",
+                        help = "draw the unit overlay")
+    
+    parser.add_argument("-g", "--grid",
+                        action = "store_true",
+                        help = "draw the tile grid")
+    
+    parser.add_argument("-a", "--animated",
+                        action = "store_true",
+                        help = "draw animated tiles in their first frame")
+    
+    parser.add_argument("-s", "--scale",
+                        type = float,
+                        default = 1.0,
+                        help = "image scale, e.g. 0.25 for thumbnails (default: 1)")
+    
+    parser.add_argument("-j", "--jobs",
+                        type = int,
+                        help = "number of worker processes (default: number of CPUs)")
+    
+    args = parser.parse_args(argv)
+    
+    levels = find_levels(args.levels)
+    if not levels:
+        print("No level files found.")
+        return 1
+    tileset = find_tileset(args.tiles, args.tileset)
+    if tileset is None:
+        print(f"Tileset '{args.tileset or 'tiles.png'}' not found in '{args.tiles}'.")
+        return 1
+    
+    start = time.perf_counter()
+    jobs = [(path, os.path.join(args.output, relative + ".png"), args.units, args.grid,
+             args.animated, args.scale) for path, relative in levels]
+    failed = 0
+    with ProcessPoolExecutor(max_workers = args.jobs, initializer = init_worker,
+                             initargs = (args.tiles, tileset)) as executor:
+        futures = [executor.submit(render_level, *job) for job in jobs]
+        for future in futures:
+            path, output, error, elapsed = future.result()
+            if error:
+                failed += 1
+                print(f"{path}: {error}")
+            else:
+                print(f"{path} -> {output} ({elapsed:.0f} ms)")
+    
+    print(f"\n{len(levels) - failed} of {len(levels)} levels rendered in "
+          f"{time.perf_counter() - start:.2f} s.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
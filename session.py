@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# session recording and replay
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import statistics
+from PyQt5.QtCore import QObject, QEvent, QPointF, Qt
+from PyQt5.QtGui import QMouseEvent, QKeyEvent
+from PyQt5.QtWidgets import QApplication, QShortcut
+
+from constants import EMPTY_TILE
+
+SESSION_VERSION = 2
+# Time budget of one replayed event with the frame it paints (ms), 60 frames per second
+DEFAULT_FRAME_BUDGET = 1000 / 60
+
+MOUSE_EVENTS = {
+    QEvent.MouseButtonPress: "press",
+    QEvent.MouseButtonRelease: "release",
+    QEvent.MouseMove: "move",
+}
+MOUSE_EVENT_TYPES = {name: event_type for event_type, name in MOUSE_EVENTS.items()}
+
+def encode(data):
+    """Get bytes as text for the session file"""
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+def decode(text):
+    """Get bytes from encode()"""
+    return base64.b64decode(text)
+
+def editor_state(editor):
+    """Get the map tiles, erased cells and the unit table of an editor as text"""
+    return {"tiles": encode(editor.map_data.tiles), "erased": encode(editor.map_data.erased),
+            "units": encode(editor.map_data.units.snapshot())}
+
+def state_cells(state):
+    """Get the tile ids of a state from editor_state(), EMPTY_TILE for erased cells"""
+    tiles = decode(state["tiles"])
+    erased = decode(state["erased"])
+    return [EMPTY_TILE if erased[position] else tile_id for position, tile_id in enumerate(tiles)]
+
+class SessionRecorder(QObject):
+    """Records the input of an editing session
+    
+    Mouse events of the map canvas and the tile palette, key presses, shortcuts,
+    scrolling, the view checkboxes and the changes of the unit editor are kept
+    with their time since the start. The session file also holds the map and the
+    units at the start and at the end, so a replay can check the result.
+    """
+    
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.targets = {}
+        self.events = []
+        self.initial = None
+        self.start_time = None
+        # Undo history entries made before the recording, a replay starts without them
+        self.old_entries = []
+        self.old_entry_ids = set()
+    
+    def start(self):
+        """Start recording from the current map
+        
+        The undo history is kept, but undo and redo cannot go past the start
+        of the recording (see can_undo()), since a replay starts without it.
+        """
+        editor = self.editor
+        editor.end_stroke()
+        history = editor.map_data.history
+        self.old_entries = list(history.undo_stack) + list(history.redo_stack)
+        self.old_entry_ids = {id(entry) for entry in self.old_entries}
+        self.targets = {editor: "editor", editor.canvas: "canvas", editor.palette: "palette"}
+        self.events = []
+        scroll_area = editor.scroll_area
+        self.initial = dict(
+            editor_state(editor),
+            size=[editor.width(), editor.height()],
+            scroll=[scroll_area.horizontalScrollBar().value(), scroll_area.verticalScrollBar().value()],
+            window=[editor.map_window_x, editor.map_window_y],
+            selected_tile=editor.palette.selected_tile,
+            cursor=list(editor.cursor_cell),
+            tileset=editor.tile_manager.current_tileset,
+            animations=editor.animate_cb.isChecked(),
+            units_shown=editor.unitov_cb.isChecked(),
+        )
+        self.start_time = time.perf_counter()
+        QApplication.instance().installEventFilter(self)
+        scroll_area.horizontalScrollBar().valueChanged.connect(self.record_scroll)
+        scroll_area.verticalScrollBar().valueChanged.connect(self.record_scroll)
+        editor.animate_cb.toggled.connect(self.record_animations)
+        editor.unitov_cb.toggled.connect(self.record_units_shown)
+    
+    def stop(self):
+        """Stop recording, returns the session as a dict"""
+        editor = self.editor
+        QApplication.instance().removeEventFilter(self)
+        scroll_area = editor.scroll_area
+        scroll_area.horizontalScrollBar().valueChanged.disconnect(self.record_scroll)
+        scroll_area.verticalScrollBar().valueChanged.disconnect(self.record_scroll)
+        editor.animate_cb.toggled.disconnect(self.record_animations)
+        editor.unitov_cb.toggled.disconnect(self.record_units_shown)
+        editor.end_stroke()
+        self.old_entries = []
+        self.old_entry_ids = set()
+        return {"version": SESSION_VERSION, "initial": self.initial,
+                "events": self.events, "final": editor_state(editor)}
+    
+    def can_undo(self):
+        """Check that the next undo step was made while recording"""
+        undo_stack = self.editor.map_data.history.undo_stack
+        return bool(undo_stack) and id(undo_stack[-1]) not in self.old_entry_ids
+    
+    def can_redo(self):
+        """Check that the next redo step was made while recording"""
+        redo_stack = self.editor.map_data.history.redo_stack
+        return bool(redo_stack) and id(redo_stack[-1]) not in self.old_entry_ids
+    
+    def add(self, kind, *args):
+        """Record an event with the time since the start in ms"""
+        self.events.append([kind, round((time.perf_counter() - self.start_time) * 1000, 1)] + list(args))
+    
+    def eventFilter(self, obj, event):
+        """Record the input events of the canvas, palette and editor"""
+        event_type = event.type()
+        if event_type in MOUSE_EVENTS:
+            target = self.targets.get(obj)
+            if target in ("canvas", "palette"):
+                self.add("mouse", target, MOUSE_EVENTS[event_type], event.pos().x(), event.pos().y(),
+                         int(event.button()), int(event.buttons()), int(event.modifiers()))
+        elif event_type == QEvent.KeyPress:
+            # Only the first receiver, not the parents it propagates to
+            target = self.targets.get(obj)
+            if target and obj is QApplication.focusWidget():
+                self.add("key", target, event.key(), int(event.modifiers()), event.text())
+        elif event_type == QEvent.Shortcut and isinstance(obj, QShortcut) and obj.parent() is self.editor:
+            self.add("shortcut", obj.key().toString())
+        return False
+    
+    def record_scroll(self, value):
+        scroll_area = self.editor.scroll_area
+        self.add("scroll", scroll_area.horizontalScrollBar().value(), scroll_area.verticalScrollBar().value())
+    
+    def record_animations(self, checked):
+        self.add("check", "animations", checked)
+    
+    def record_units_shown(self, checked):
+        self.add("check", "units", checked)
+    
+    def record_units(self):
+        """Record the unit table after a change in the unit editor"""
+        self.add("units", encode(self.editor.map_data.units.snapshot()))
+
+def save_session(session, path):
+    """Write a recorded session to a JSON file"""
+    with open(path, "w") as f:
+        json.dump(session, f)
+
+def load_session(path):
+    """Read a session file"""
+    with open(path) as f:
+        session = json.load(f)
+    if session.get("version") != SESSION_VERSION:
+        raise ValueError(f"Unsupported session version {session.get('version')}")
+    return session
+
+class SessionPlayer:
+    """Replays a recorded session on an editor
+    
+    Events are replayed as fast as possible in recorded order, not at their
+    recorded time, and every event is followed by the frame it causes, so a
+    replay is deterministic. Animations are paused. The time of every event
+    with its frame is kept in frame_times (ms).
+    """
+    
+    def __init__(self, editor, session):
+        self.editor = editor
+        self.session = session
+        self.frame_times = []
+        self.targets = {"editor": editor, "canvas": editor.canvas, "palette": editor.palette}
+        self.shortcuts = {shortcut.key().toString(): shortcut
+                          for shortcut in editor.findChildren(QShortcut)}
+    
+    def restore_initial(self):
+        """Bring the editor to the state at the start of the recording"""
+        editor = self.editor
+        initial = self.session["initial"]
+        editor.animation_controller.pause("replay")
+        editor.end_stroke()
+        if initial.get("tileset") in editor.tile_manager.tileset_files:
+            editor.tileset_combo.setCurrentIndex(editor.tile_manager.tileset_files.index(initial["tileset"]))
+        editor.resize(*initial["size"])
+        editor.animate_cb.setChecked(initial["animations"])
+        editor.unitov_cb.setChecked(initial["units_shown"])
+        editor.map_data.replace_tiles(state_cells(initial))
+        editor.map_data.units.restore(decode(initial["units"]))
+        editor.map_data.history.clear()
+        editor.map_window_x, editor.map_window_y = initial["window"]
+        editor.palette.set_selected_tile(initial["selected_tile"])
+        editor.cursor_cell = tuple(initial.get("cursor", (0, 0)))
+        editor.update_map_display(full=True)
+        QApplication.processEvents()
+        editor.scroll_area.horizontalScrollBar().setValue(initial["scroll"][0])
+        editor.scroll_area.verticalScrollBar().setValue(initial["scroll"][1])
+        QApplication.processEvents()
+    
+    def dispatch(self, event):
+        """Replay one recorded event"""
+        editor = self.editor
+        kind = event[0]
+        if kind == "mouse":
+            target, action, x, y, button, buttons, modifiers = event[2:]
+            QApplication.sendEvent(self.targets[target], QMouseEvent(
+                MOUSE_EVENT_TYPES[action], QPointF(x, y), Qt.MouseButton(button),
+                Qt.MouseButtons(buttons), Qt.KeyboardModifiers(modifiers)))
+        elif kind == "key":
+            target, key, modifiers, text = event[2:]
+            QApplication.sendEvent(self.targets[target], QKeyEvent(
+                QEvent.KeyPress, key, Qt.KeyboardModifiers(modifiers), text))
+        elif kind == "shortcut":
+            shortcut = self.shortcuts.get(event[2])
+            if shortcut is not None:
+                shortcut.activated.emit()
+        elif kind == "scroll":
+            editor.scroll_area.horizontalScrollBar().setValue(event[2])
+            editor.scroll_area.verticalScrollBar().setValue(event[3])
+        elif kind == "check":
+            checkbox = editor.animate_cb if event[2] == "animations" else editor.unitov_cb
+            checkbox.setChecked(event[3])
+        elif kind == "units":
+            editor.map_data.units.restore(decode(event[2]))
+            editor.update_map_display()
+    
+    def play(self):
+        """Replay all events, returns the differences of the final state (see compare_final)"""
+        editor = self.editor
+        self.restore_initial()
+        self.frame_times = []
+        for event in self.session["events"]:
+            start = time.perf_counter()
+            self.dispatch(event)
+            # Paint now instead of with the next display refresh
+            if editor.frame_timer.isActive():
+                editor.update_map_display()
+            QApplication.processEvents()
+            self.frame_times.append((time.perf_counter() - start) * 1000)
+        editor.end_stroke()
+        return self.compare_final()
+    
+    def compare_final(self):
+        """Get the number of map cells and units that differ from the recorded end"""
+        final = self.session["final"]
+        cells = sum(1 for a, b in zip(state_cells(final), state_cells(editor_state(self.editor))) if a != b)
+        size = self.editor.map_data.units.size
+        expected = decode(final["units"])
+        snapshot = self.editor.map_data.units.snapshot()
+        units = sum(1 for unit_id in range(size)
+                    if any(expected[column * size + unit_id] != snapshot[column * size + unit_id]
+                           for column in range(len(snapshot) // size)))
+        return cells, units
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog = 'session',
+             description = "Replay a recorded editing session without opening windows.")
+    
+    parser.add_argument("session",
+                        help = "session file recorded in the editor; e.g. session.json")
+    
+    parser.add_argument("-t", "--tiles",
+                        default = "tiles",
+                        help = "tileset directory, synthetic tilesets are used if it is missing (default: tiles)")
+    
+    parser.add_argument("-b", "--budget",
+                        type = float,
+                        default = DEFAULT_FRAME_BUDGET,
+                        help = f"time budget of every event with its frame in ms (default: {DEFAULT_FRAME_BUDGET:.1f})")
+    
+    parser.add_argument("--allowed-overruns",
+                        type = int,
+                        default = 0,
+                        help = "number of events allowed to exceed the budget (default: 0)")
+    
+    args = parser.parse_args(argv)
+    
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import io
+    import tempfile
+    import contextlib
+    from synthetic_tiles import create_synthetic_tilesets
+    from tilemap_editor import TileMapEditor
+    
+    try:
+        session = load_session(args.session)
+    except (OSError, ValueError) as e:
+        print(f"Error reading session '{args.session}': {e}")
+        return 1
+    
+    app = QApplication.instance() or QApplication(["session"])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tileset_dir = args.tiles
+        if not os.path.exists(os.path.join(tileset_dir, "tiles.png")):
+            print(f"No tileset in '{args.tiles}', using synthetic tilesets.")
+            tileset_dir = temp_dir
+            create_synthetic_tilesets(tileset_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            editor = TileMapEditor(tileset_dir=tileset_dir)
+        editor.show()
+        player = SessionPlayer(editor, session)
+        cells, units = player.play()
+        editor.close()
+    
+    times = player.frame_times
+    overruns = [t for t in times if t > args.budget]
+    print(f"{len(times)} events replayed in {sum(times):.1f} ms")
+    if times:
+        p95 = statistics.quantiles(times, n=20, method="inclusive")[-1] if len(times) > 1 else times[0]
+        print(f"Frame time: median {statistics.median(times):.2f} ms, 95% {p95:.2f} ms, "
+              f"max {max(times):.2f} ms, {len(overruns)} over the budget of {args.budget:.1f} ms")
+    
+    failed = False
+    if len(overruns) > args.allowed_overruns:
+        print(f"FAIL: {len(overruns)} events exceeded the frame budget.")
+        failed = True
+    if cells or units:
+        print(f"FAIL: The final state differs from the recording: {cells} map cells, {units} units.")
+        failed = True
+    if not failed:
+        print("OK: Final map and units are identical to the recording.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
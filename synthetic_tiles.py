@@ -0,0 +1,29 @@
+# synthetic tilesets for the benchmark and session replay
+import os
+import random
+
+from constants import TILE_SIZE
+
+# Size of the synthetic tilesets used when there is no tiles directory
+SYNTHETIC_TILES = 253
+SYNTHETIC_ANIM_FRAMES = 36
+
+def create_synthetic_tilesets(tileset_dir):
+    """Write tiles.png and animtiles.png with a deterministic pattern per tile"""
+    from PyQt5.QtGui import QImage, QPainter, QColor
+    
+    rng = random.Random(0)
+    for filename, count in (("tiles.png", SYNTHETIC_TILES), ("animtiles.png", SYNTHETIC_ANIM_FRAMES)):
+        # One column of tiles, like the tilesets of the game
+        image = QImage(32, count * TILE_SIZE, QImage.Format_ARGB32)
+        image.fill(QColor(0, 0, 0))
+        painter = QPainter(image)
+        for tile_id in range(count):
+            top = tile_id * TILE_SIZE
+            painter.fillRect(0, top, TILE_SIZE, TILE_SIZE, QColor(*(rng.randrange(256) for _ in range(3))))
+            for _ in range(6):
+                painter.fillRect(rng.randrange(TILE_SIZE - 4), top + rng.randrange(TILE_SIZE - 4),
+                                 rng.randrange(2, 5), rng.randrange(2, 5),
+                                 QColor(*(rng.randrange(256) for _ in range(3))))
+        painter.end()
+        image.save(os.path.join(tileset_dir, filename))
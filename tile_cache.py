@@ -0,0 +1,122 @@
+# decoded tileset cache
+import os
+import struct
+import hashlib
+import threading
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtCore import QSize
+
+from constants import TILE_CACHE_DIR, TILE_CACHE_LIMIT
+
+# Entry header: magic, width, height, bytes per line
+CACHE_HEADER = struct.Struct("<4sIII")
+CACHE_MAGIC = b"TIL1"
+CACHE_SUFFIX = ".tiles"
+CACHE_FORMAT = QImage.Format_ARGB32_Premultiplied
+
+class TileCache:
+    """On-disk cache of decoded tileset images
+    
+    Entries are keyed by path, size and modification time of a PNG file and hold
+    its raw ARGB pixels, so unchanged tilesets are loaded without PNG decoding.
+    The least recently used entries are removed when the cache exceeds its limit.
+    """
+    
+    def __init__(self, cache_dir=TILE_CACHE_DIR, limit=TILE_CACHE_LIMIT):
+        self.cache_dir = cache_dir
+        self.limit = limit
+    
+    def entry_path(self, path):
+        """Get the cache file of an image file, None if the file is missing"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + CACHE_SUFFIX)
+    
+    def load_image(self, path):
+        """Load an image file, from the cache if it is unchanged"""
+        entry = self.entry_path(path)
+        if entry is None:
+            return QImage()
+        
+        image = self._read(entry)
+        if image is None:
+            # Cache miss: decode the PNG and keep the pixels for the next time
+            image = QImage(path)
+            if image.isNull():
+                return image
+            image = image.convertToFormat(CACHE_FORMAT)
+            self._write(entry, image)
+        return image
+    
+    def image_size(self, path):
+        """Get the size of an image file without decoding it"""
+        entry = self.entry_path(path)
+        if entry is not None:
+            try:
+                with open(entry, "rb") as f:
+                    magic, width, height, _ = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+                if magic == CACHE_MAGIC:
+                    return QSize(width, height)
+            except (OSError, struct.error):
+                pass
+        return QImageReader(path).size()
+    
+    def _read(self, entry):
+        """Read a cache entry, None if it is missing or damaged"""
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+            magic, width, height, bytes_per_line = CACHE_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != CACHE_MAGIC or len(data) != CACHE_HEADER.size + bytes_per_line * height:
+            return None
+        
+        # Mark as recently used for eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        # copy() detaches the image from the file data
+        return QImage(data[CACHE_HEADER.size:], width, height, bytes_per_line, CACHE_FORMAT).copy()
+    
+    def _write(self, entry, image):
+        """Write a cache entry and evict old entries"""
+        header = CACHE_HEADER.pack(CACHE_MAGIC, image.width(), image.height(), image.bytesPerLine())
+        pixels = image.constBits().asstring(image.byteCount())
+        # One temporary file per process and thread, batch renderers and the
+        # tileset preload fill the cache in parallel
+        temp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                f.write(pixels)
+            os.replace(temp_path, entry)
+        except OSError as e:
+            print(f"Warning: Could not write tile cache {entry}: {e}")
+            return
+        self.evict()
+    
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its limit"""
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                       if name.endswith(CACHE_SUFFIX)]
+            stats = sorted(((os.stat(entry), entry) for entry in entries),
+                           key=lambda item: item[0].st_mtime)
+        except OSError:
+            return
+        
+        total = sum(stat.st_size for stat, _ in stats)
+        for stat, entry in stats:
+            if total <= self.limit:
+                break
+            try:
+                os.remove(entry)
+                total -= stat.st_size
+            except OSError:
+                pass
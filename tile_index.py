@@ -0,0 +1,138 @@
+# tile index and map image import
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import Qt, QRectF
+
+from constants import TILE_SIZE, DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT, EMPTY_TILE, TABLE_SIZE
+from tile_manager import TILES_ATLAS, tile_hashes
+from map_data import MapData
+
+# Edge length of the thumbnails used for the average hash (8 x 8 = 64 bits)
+THUMB_SIZE = 8
+INDEX_FORMAT = QImage.Format_ARGB32_Premultiplied
+
+def thumbnail(image):
+    """Get the RGB bytes of an image scaled to THUMB_SIZE x THUMB_SIZE"""
+    thumb = image.scaled(THUMB_SIZE, THUMB_SIZE, Qt.IgnoreAspectRatio,
+                         Qt.SmoothTransformation).convertToFormat(QImage.Format_RGB888)
+    line = thumb.bytesPerLine()
+    data = thumb.constBits().asstring(thumb.byteCount())
+    return b''.join(data[y * line:y * line + THUMB_SIZE * 3] for y in range(THUMB_SIZE))
+
+def average_hash(thumb):
+    """Get the 64 bit average hash (aHash) of a thumbnail"""
+    gray = [thumb[i] + thumb[i + 1] + thumb[i + 2] for i in range(0, len(thumb), 3)]
+    mean = sum(gray) / len(gray)
+    bits = 0
+    for value in gray:
+        bits = (bits << 1) | (value > mean)
+    return bits
+
+class TileIndex:
+    """Find tile ids by the pixels of a tile
+    
+    Exact copies of a tile are found by a hash of their pixels. Other images
+    (scaled, compressed, with a grid drawn over them) get the nearest tile: the
+    one with the lowest sum of average hash distance (bits) and mean color
+    distance of the thumbnails. NumPy is used for the search if installed.
+    """
+    
+    def __init__(self, image, rects):
+        image = image.convertToFormat(INDEX_FORMAT)
+        # Pixel hash -> tile id, the first tile wins for duplicates
+        self.exact = {}
+        for tile_id, digest in enumerate(tile_hashes(image, rects)):
+            self.exact.setdefault(digest, tile_id)
+        # Thumbnail and average hash of every tile id
+        self.thumbs = [thumbnail(image.copy(rect.toRect())) for rect in rects]
+        self.hashes = [average_hash(thumb) for thumb in self.thumbs]
+        # Thumbnail -> tile id of earlier nearest matches
+        self.nearest_cache = {}
+        
+        try:
+            import numpy
+        except ImportError:
+            self.numpy = None
+        else:
+            self.numpy = numpy
+            self.thumb_array = numpy.array([numpy.frombuffer(thumb, numpy.uint8) for thumb in self.thumbs],
+                                           dtype=numpy.int32).reshape(len(self.thumbs), -1)
+            self.hash_array = numpy.array(self.hashes, dtype=numpy.uint64)
+    
+    @classmethod
+    def from_tile_manager(cls, tile_manager):
+        """Build the index of the tiles of the loaded tileset a level can hold"""
+        return cls(tile_manager.atlases[TILES_ATLAS].toImage(), tile_manager.tile_rects[:TABLE_SIZE])
+    
+    def nearest(self, image):
+        """Get the tile id that looks most like an image"""
+        thumb = thumbnail(image)
+        if thumb in self.nearest_cache:
+            return self.nearest_cache[thumb]
+        if not self.thumbs:
+            return EMPTY_TILE
+        
+        bits = average_hash(thumb)
+        pixels = THUMB_SIZE * THUMB_SIZE
+        if self.numpy is not None:
+            numpy = self.numpy
+            distances = numpy.unpackbits((self.hash_array ^ numpy.uint64(bits)).view(numpy.uint8))
+            colors = numpy.abs(self.thumb_array - numpy.frombuffer(thumb, numpy.uint8)).sum(axis=1)
+            scores = distances.reshape(len(self.thumbs), -1).sum(axis=1) + colors / pixels
+            best_id = int(scores.argmin())
+        else:
+            # By increasing hash distance, the color distance can only add to it
+            best_id, best_score = EMPTY_TILE, None
+            for distance, tile_id in sorted((bin(bits ^ tile_bits).count("1"), tile_id)
+                                            for tile_id, tile_bits in enumerate(self.hashes)):
+                if best_score is not None and distance >= best_score:
+                    break
+                score = distance + sum(abs(a - b) for a, b in zip(thumb, self.thumbs[tile_id])) / pixels
+                if best_score is None or score < best_score:
+                    best_id, best_score = tile_id, score
+        self.nearest_cache[thumb] = best_id
+        return best_id
+
+def image_to_tiles(image, index, width=DEFAULT_MAP_WIDTH, height=DEFAULT_MAP_HEIGHT,
+                   tile_size=TILE_SIZE):
+    """Get the tile ids of the cells of a map image as a list of width x height cells
+    
+    The image is cut into tile_size cells from the top left, cells outside the
+    image are empty (EMPTY_TILE). An image of exactly width x height cells of another size
+    (e.g. a render with 8 pixel tiles) is scaled to tile_size first.
+    """
+    columns = image.width() // tile_size
+    rows = image.height() // tile_size
+    if (image.width() % width == 0 and image.height() % height == 0
+            and image.width() // width == image.height() // height
+            and image.width() // width != tile_size):
+        image = image.scaled(width * tile_size, height * tile_size,
+                             Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        columns, rows = width, height
+    image = image.convertToFormat(INDEX_FORMAT)
+    columns = min(columns, width)
+    rows = min(rows, height)
+    
+    rects = [QRectF(x * tile_size, y * tile_size, tile_size, tile_size)
+             for y in range(rows) for x in range(columns)]
+    tiles = [EMPTY_TILE] * (width * height)
+    for rect, digest in zip(rects, tile_hashes(image, rects)):
+        x = int(rect.x()) // tile_size
+        y = int(rect.y()) // tile_size
+        tile_id = index.exact.get(digest)
+        if tile_id is None:
+            tile_id = index.nearest(image.copy(rect.toRect()))
+        tiles[y * width + x] = tile_id
+    return tiles
+
+def import_map_image(path, tile_manager):
+    """Create a MapData with the tiles recognized in a map image file"""
+    image = QImage(path)
+    if image.isNull():
+        raise IOError(f"Cannot read image '{path}'")
+    map_data = MapData()
+    map_data.replace_tiles(image_to_tiles(image, TileIndex.from_tile_manager(tile_manager),
+                                          map_data.width, map_data.height))
+    # A new map, nothing to undo
+    map_data.history.clear()
+    map_data.mark_dirty()
+    return map_data
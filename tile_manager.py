@@ -1,37 +1,97 @@
 # tile manager
 import os
-from PyQt5.QtGui import QImage, QPixmap
+import hashlib
+from PyQt5.QtGui import QPixmap, QPainter
+from PyQt5.QtCore import QRectF, QFileSystemWatcher, QTimer
 
-from constants import ANIM_TILES_NAME
+from constants import ANIM_TILES_NAME, ANIMATIONS_FILE, LAZY_ANIM_TILES
+from constants import TILESET_PRELOAD_WORKERS, TILESET_RELOAD_DELAY, TABLE_SIZE
+from tile_cache import TileCache
+from animation_defs import load_animations
+from profiler import timed
+
+# Atlas indices returned by get_tile_source
+TILES_ATLAS = 0
+ANIM_ATLAS = 1
+
+def tile_hashes(image, rects):
+    """Get a hash of the pixels of every tile rect in an image"""
+    if image.isNull():
+        return []
+    data = image.constBits().asstring(image.byteCount())
+    line = image.bytesPerLine()
+    depth = image.depth() // 8
+    hashes = []
+    for rect in rects:
+        start = int(rect.x()) * depth
+        end = start + int(rect.width()) * depth
+        tile = hashlib.sha1()
+        for y in range(int(rect.y()), int(rect.y() + rect.height())):
+            tile.update(data[y * line + start:y * line + end])
+        hashes.append(tile.digest())
+    return hashes
 
 class TileManager:
-    """Manages tile loading and animation"""
+    """Manages tile loading and animation
+    
+    Each tileset is kept as one atlas pixmap with a table of tile source rects.
+    """
     
     def __init__(self, tile_size):
         self.tile_size = tile_size
-        self.tiles = []
-        self.anim_tiles = []
+        self.atlases = [QPixmap(), QPixmap()]  # TILES_ATLAS, ANIM_ATLAS
+        # Animated tileset file, and the same while it waits to be decoded (lazy loading)
+        self.anim_path = None
+        self.pending_anim_path = None
+        # Cache key (path, size, mtime) and tile hashes of the loaded atlases,
+        # the hashes are None until the first reload needs them
+        self.atlas_keys = [None, None]
+        self.atlas_hashes = [None, None]
+        # Watches the tileset files, see watch()
+        self.watcher = None
+        self.reload_timer = None
+        self.reload_callback = None
+        self.cache = TileCache()
+        # Tilesets decoded on worker threads: filename -> (cache entry, future QImage)
+        self.preloads = {}
+        self.executor = None
+        self.tile_rects = []
+        self.anim_rects = []
+        # (atlas index, source rect) or None for every tile id,
+        # still tiles and the current frame of every animated tile
+        self.static_table = [None] * TABLE_SIZE
+        self.frame_table = [None] * TABLE_SIZE
         self.tileset_files = []
         self.tileset_dir = "tiles"
         self.current_tileset = None
         
-        # Animation mapping: tile_id -> range of animation frames
-        self.animation_map = {
-            204: range(20, 24),   # WATER: frames 20, 21, 22, 23 in anim_tiles
-            66: range(0, 4),      # FLAG: frames 0, 1, 2, 3
-            148: range(4, 8),     # TRASH COMPACTOR: frames 4, 5, 6, 7
-            143: range(16, 20),   # SERVER: frames 16, 17, 18, 19
-            196: range(8, 10),    # HVAC 1: frames 8, 9
-            197: range(10, 12),   # HVAC 2: frames 10, 11
-            200: range(12, 14),   # HVAC 3: frames 12, 13
-            201: range(14, 16),   # HVAC 4: frames 14, 15
-            20: range(24, 28),    # CINEMA 1: frames 24, 25, 26, 27
-            21: range(28, 32),    # CINEMA 2: frames 28, 29, 30, 31
-            22: range(32, 36),    # CINEMA 3: frames 32, 33, 34, 35
-        }
+        # Animation definitions: tile_id -> frames in anim_tiles, tile_id -> frame duration (ms)
+        self.animation_map = {}
+        self.animation_durations = {}
+        # Frame index currently shown for each animated tile
+        self.current_frames = {}
         
         # List of tiles that can be animated
-        self.animated_tiles = [20, 21, 22, 66, 143, 148, 196, 197, 200, 201, 204]
+        self.animated_tiles = []
+        self.load_animations()
+    
+    def load_animations(self, path=ANIMATIONS_FILE):
+        """Load the animated tile definitions from a JSON file"""
+        self.animation_map = {}
+        self.animation_durations = {}
+        for tile_id, frames, duration in load_animations(path):
+            if 0 <= tile_id < TABLE_SIZE:
+                self.animation_map[tile_id] = frames
+                self.animation_durations[tile_id] = duration
+        self.animated_tiles = sorted(self.animation_map)
+        self.current_frames = {}
+        self._build_source_tables()
+        return len(self.animated_tiles)
+    
+    def animation_timing(self):
+        """Get tile_id -> (frame count, frame duration) of all animated tiles"""
+        return {tile_id: (len(frames), self.animation_durations[tile_id])
+                for tile_id, frames in self.animation_map.items()}
     
     def scan_tileset_directory(self):
         """Scan the tileset directory for available tilesets"""
@@ -41,26 +101,63 @@ class TileManager:
         self.tileset_files = [f for f in os.listdir(self.tileset_dir) if f.endswith(".png")]
         return self.tileset_files
     
+    def _slice(self, width, height):
+        """Get the source rects of all tiles in an atlas of the given size, row by row"""
+        tiles_per_row = width // self.tile_size
+        tiles_per_col = height // self.tile_size
+        return [QRectF(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+                for y in range(tiles_per_col) for x in range(tiles_per_row)]
+    
+    def preload_tilesets(self):
+        """Decode all tilesets of the directory into QImages on worker threads
+        
+        With LAZY_ANIM_TILES the animated tileset is left out, it is decoded
+        when the first animation frame is drawn.
+        """
+        self.cancel_preloads()
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=TILESET_PRELOAD_WORKERS)
+        for filename in self.tileset_files:
+            if LAZY_ANIM_TILES and filename == ANIM_TILES_NAME:
+                continue
+            if filename != self.current_tileset:
+                path = os.path.join(self.tileset_dir, filename)
+                self.preloads[filename] = (self.cache.entry_path(path),
+                                           self.executor.submit(self.cache.load_image, path))
+    
+    def cancel_preloads(self):
+        """Drop the preloaded tilesets, decoding that has not started is skipped"""
+        for _, future in self.preloads.values():
+            future.cancel()
+        self.preloads = {}
+    
+    def _load_image(self, filename):
+        """Get the decoded image of a tileset, preloaded if it is unchanged"""
+        path = os.path.join(self.tileset_dir, filename)
+        entry, future = self.preloads.get(filename, (None, None))
+        if future is not None and entry == self.cache.entry_path(path) and not future.cancelled():
+            # Decoded, or decoding on a worker thread
+            return future.result()
+        return self.cache.load_image(path)
+    
+    @timed("load_tileset")
     def load_tileset(self, filename):
-        """Load a tileset from a PNG file"""
+        """Load a tileset from a PNG file
+        
+        The pixmap is created here on the GUI thread, the image may come from preload_tilesets().
+        """
         self.current_tileset = filename
         path = os.path.join(self.tileset_dir, filename)
-        tileset_img = QImage(path)
-        self.tiles = []
-        
-        # Calculate how many tiles fit in the image
-        tiles_per_row = tileset_img.width() // self.tile_size
-        tiles_per_col = tileset_img.height() // self.tile_size
-        
-        # Extract individual tiles
-        for y in range(tiles_per_col):
-            for x in range(tiles_per_row):
-                tile_rect = (x * self.tile_size, y * self.tile_size, 
-                           self.tile_size, self.tile_size)
-                tile = tileset_img.copy(*tile_rect)
-                self.tiles.append(QPixmap.fromImage(tile))
-        
-        return len(self.tiles)
+        image = self._load_image(filename)
+        atlas = QPixmap.fromImage(image)
+        self.atlases[TILES_ATLAS] = atlas
+        self.tile_rects = self._slice(atlas.width(), atlas.height())
+        self.atlas_keys[TILES_ATLAS] = self.cache.entry_path(path)
+        self.atlas_hashes[TILES_ATLAS] = None
+        self._build_source_tables()
+        self._update_watched_paths()
+        return len(self.tile_rects)
     
     def load_animated_tileset(self, filename = ANIM_TILES_NAME):
         """Load animated tiles from a separate tileset"""
@@ -68,36 +165,171 @@ class TileManager:
         if not os.path.exists(path):
             print(f"Warning: Animated tileset not found at {path}")
             return 0
-            
-        tileset_img = QImage(path)
-        self.anim_tiles = []
         
-        # Extract animation frames
-        tiles_per_row = tileset_img.width() // self.tile_size
-        tiles_per_col = tileset_img.height() // self.tile_size
+        self.anim_path = path
+        self.atlas_keys[ANIM_ATLAS] = self.cache.entry_path(path)
+        if LAZY_ANIM_TILES:
+            # Only the size is read now, the frames are decoded when first drawn
+            self.atlases[ANIM_ATLAS] = QPixmap()
+            self.atlas_hashes[ANIM_ATLAS] = None
+            self.pending_anim_path = path
+            size = self.cache.image_size(path)
+            self.anim_rects = self._slice(size.width(), size.height())
+        else:
+            self.pending_anim_path = None
+            self._decode_animated_tileset()
+        self._build_source_tables()
+        self._update_watched_paths()
+        return len(self.anim_rects)
+    
+    def _decode_animated_tileset(self):
+        """Decode the animated tileset into its atlas, preloaded if it is unchanged"""
+        image = self._load_image(os.path.basename(self.anim_path))
+        self.atlases[ANIM_ATLAS] = QPixmap.fromImage(image)
+        self.anim_rects = self._slice(image.width(), image.height())
+        self.atlas_hashes[ANIM_ATLAS] = None
+    
+    def atlas(self, atlas_index):
+        """Get an atlas pixmap, decoding the animated tileset on first use"""
+        if atlas_index == ANIM_ATLAS and self.pending_anim_path:
+            self.pending_anim_path = None
+            self._decode_animated_tileset()
+        return self.atlases[atlas_index]
+    
+    def watch(self, callback):
+        """Reload the tilesets when their files change
+        
+        callback(tile_ids) is called after a reload, see reload_changed_tiles().
+        """
+        self.reload_callback = callback
+        if self.watcher is None:
+            self.watcher = QFileSystemWatcher()
+            self.watcher.fileChanged.connect(self._on_file_changed)
+            self.watcher.directoryChanged.connect(self._on_file_changed)
+            # Paint programs write a file in several steps, reload after the last one
+            self.reload_timer = QTimer()
+            self.reload_timer.setSingleShot(True)
+            self.reload_timer.setInterval(TILESET_RELOAD_DELAY)
+            self.reload_timer.timeout.connect(self._reload)
+        self._update_watched_paths()
+    
+    def _update_watched_paths(self):
+        """Watch the tileset directory and the loaded tileset files"""
+        if self.watcher is None:
+            return
+        watched = self.watcher.files() + self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        paths = [self.tileset_dir, self.anim_path]
+        if self.current_tileset:
+            paths.append(os.path.join(self.tileset_dir, self.current_tileset))
+        paths = [path for path in paths if path and os.path.exists(path)]
+        if paths:
+            self.watcher.addPaths(paths)
+    
+    def _on_file_changed(self, path):
+        """Schedule a reload after a tileset file changed"""
+        self.reload_timer.start()
+    
+    def _reload(self):
+        """Reload changed tiles and notify the callback"""
+        tile_ids = self.reload_changed_tiles()
+        # Files replaced by renaming are no longer watched
+        self._update_watched_paths()
+        if (tile_ids is None or tile_ids) and self.reload_callback:
+            self.reload_callback(tile_ids)
+    
+    def reload_changed_tiles(self):
+        """Replace the tiles whose pixels changed in the tileset files
+        
+        Returns the ids of the tiles that look different now,
+        None if a tileset changed its size and was loaded completely.
+        """
+        changed = set()
+        reloaded = False
         
-        for y in range(tiles_per_col):
-            for x in range(tiles_per_row):
-                tile_rect = (x * self.tile_size, y * self.tile_size, 
-                           self.tile_size, self.tile_size)
-                tile = tileset_img.copy(*tile_rect)
-                self.anim_tiles.append(QPixmap.fromImage(tile))
+        if self.current_tileset:
+            path = os.path.join(self.tileset_dir, self.current_tileset)
+            tiles = self._reload_atlas(TILES_ATLAS, path, self.tile_rects)
+            if tiles is None:
+                self.load_tileset(self.current_tileset)
+                reloaded = True
+            else:
+                changed.update(tiles)
         
-        return len(self.anim_tiles)
-    
-    def get_tile_pixmap(self, tile_id, anim_state=0, show_animations=True):
-        """Get the pixmap for a tile, considering animation state"""
-        # Check if it's an animated tile
-        if show_animations and tile_id in self.animation_map:
-            frame_range = self.animation_map[tile_id]
-            num_frames = len(frame_range)
-            
-            if num_frames > 0 and len(self.anim_tiles) > frame_range.start + (anim_state % num_frames):
-                frame_index = frame_range.start + (anim_state % num_frames)
-                return self.anim_tiles[frame_index]
+        if self.pending_anim_path:
+            # Not decoded yet, only the size may be needed again
+            if self.cache.entry_path(self.anim_path) != self.atlas_keys[ANIM_ATLAS]:
+                self.load_animated_tileset(os.path.basename(self.anim_path))
+        elif self.anim_path:
+            frames = self._reload_atlas(ANIM_ATLAS, self.anim_path, self.anim_rects)
+            if frames is None:
+                self.load_animated_tileset(os.path.basename(self.anim_path))
+                reloaded = True
+            else:
+                changed.update(tile_id for tile_id, frame_list in self.animation_map.items()
+                               if frames.intersection(frame_list))
         
-        # Return normal tile if not animated or animations disabled
-        if 0 <= tile_id < len(self.tiles):
-            return self.tiles[tile_id]
-            
-        return None
+        return None if reloaded else changed
+    
+    def _reload_atlas(self, atlas_index, path, rects):
+        """Repaint the tiles of an atlas that differ in its changed file
+        
+        Returns the indices of the repainted tiles, None if the image size changed.
+        """
+        key = self.cache.entry_path(path)
+        if key is None or key == self.atlas_keys[atlas_index]:
+            return set()
+        image = self.cache.load_image(path)
+        if image.isNull():
+            # Probably still being written, try again with the next change
+            return set()
+        self.atlas_keys[atlas_index] = key
+        if image.size() != self.atlases[atlas_index].size():
+            return None
+        
+        old_hashes = self.atlas_hashes[atlas_index]
+        if old_hashes is None:
+            # Hashed on the first change only, the atlas still holds the tiles as loaded
+            loaded = self.atlases[atlas_index].toImage().convertToFormat(image.format())
+            old_hashes = tile_hashes(loaded, rects)
+        hashes = tile_hashes(image, rects)
+        changed = {index for index, (old, new) in
+                   enumerate(zip(old_hashes, hashes)) if old != new}
+        self.atlas_hashes[atlas_index] = hashes
+        if changed:
+            painter = QPainter(self.atlases[atlas_index])
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            for index in changed:
+                painter.drawImage(rects[index], image, rects[index])
+            painter.end()
+        return changed
+    
+    def _build_source_tables(self):
+        """Precompute the source of every tile id, still and in its current frame"""
+        self.static_table = [(TILES_ATLAS, self.tile_rects[tile_id])
+                             if tile_id < len(self.tile_rects) else None
+                             for tile_id in range(TABLE_SIZE)]
+        self.frame_table = list(self.static_table)
+        self.set_frames({tile_id: self.current_frames.get(tile_id, 0)
+                         for tile_id in self.animated_tiles})
+    
+    def set_frames(self, frames):
+        """Show the given frame index (tile_id -> frame) of animated tiles"""
+        for tile_id, frame in frames.items():
+            self.current_frames[tile_id] = frame
+            frame_list = self.animation_map[tile_id]
+            frame_index = frame_list[frame % len(frame_list)]
+            if frame_index < len(self.anim_rects):
+                self.frame_table[tile_id] = (ANIM_ATLAS, self.anim_rects[frame_index])
+            else:
+                # Frame missing in the animated tileset, show the still tile
+                self.frame_table[tile_id] = self.static_table[tile_id]
+    
+    def source_table(self, show_animations=True):
+        """Get the table of (atlas index, source rect) indexed by tile id"""
+        return self.frame_table if show_animations else self.static_table
+    
+    def get_tile_source(self, tile_id, show_animations=True):
+        """Get (atlas index, source rect) for a tile, considering animation state"""
+        return self.source_table(show_animations)[tile_id]
@@ -167,22 +167,26 @@ def save_robots_lvl(level_dict, output = ""):
         print(f"\nError writing binary map file '{filename}': {e} . Exit.")
         sys.exit(1)
 
-############# Argument parser START
-parser = argparse.ArgumentParser(prog = 'tiled2lvl', 
-         description = "Convert Tiled TMX to level.")
+def main():
+    ############# Argument parser START
+    parser = argparse.ArgumentParser(prog = 'tiled2lvl', 
+             description = "Convert Tiled TMX to level.")
 
-#filename is required
-parser.add_argument("filename",
-                    type = str,
-                    help = 'filename of the TMX file to be converted; e.g. level-a.tmx')
+    #filename is required
+    parser.add_argument("filename",
+                        type = str,
+                        help = 'filename of the TMX file to be converted; e.g. level-a.tmx')
 
-parser.add_argument("-o", "--output",
-                    type = str,
-                    help = "filename of the Robots level; e.g. level-a")
+    parser.add_argument("-o", "--output",
+                        type = str,
+                        help = "filename of the Robots level; e.g. level-a")
 
-args = parser.parse_args()
-############# Argument parser END
+    args = parser.parse_args()
+    ############# Argument parser END
 
-tmx_tree = load_tiled_map(args.filename)
-level_dict = tmx_to_level_dict(tmx_tree)
-save_robots_lvl(level_dict, args.output)
+    tmx_tree = load_tiled_map(args.filename)
+    level_dict = tmx_to_level_dict(tmx_tree)
+    save_robots_lvl(level_dict, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,25 @@ import os
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QFileDialog,
     QComboBox, QGridLayout, QVBoxLayout, QScrollArea,
-    QShortcut, QCheckBox, QHBoxLayout
+    QShortcut, QCheckBox, QHBoxLayout, QApplication
 )
-from PyQt5.QtGui import QKeySequence
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QKeySequence, QImage
+from PyQt5.QtCore import Qt, QEvent, QTimer
 
 from constants import (
-    TILE_SIZE, DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT,
-    DEFAULT_NAV_SPEED, ANIMATION_INTERVAL, APP_WIDTH, APP_HEIGHT
+    TILE_SIZE, DEFAULT_MAP_WIDTH, DEFAULT_MAP_HEIGHT, EMPTY_TILE,
+    DEFAULT_NAV_SPEED, APP_WIDTH, APP_HEIGHT
 )
 from map_data import MapData
-from tile_manager import TileManager
+from tile_manager import TileManager, TILES_ATLAS
 from animation import AnimationController
-from ui_components import TilesetPaletteWidget, MapCanvasWidget
-
-from unit_editor import UnitEditor
+from ui_components import TilesetPaletteWidget, MapCanvasWidget, ProfilerHud
+from profiler import timed
 
 class TileMapEditor(QWidget):
     """Main tile map editor application"""
     
-    def __init__(self, tileset_dir="tiles", animtiles_path="animtiles.png"):
+    def __init__(self, tileset_dir="tiles", animtiles_path="animtiles.png", defer_assets=False):
         super().__init__()
         self.setWindowTitle("Tile Map Editor")
         
@@ -38,9 +37,11 @@ class TileMapEditor(QWidget):
         
         # Initialize animation system
         self.animation_controller = AnimationController(
-            interval=ANIMATION_INTERVAL,
-            callback=self.on_animation_update
+            callback=self.on_animation_update,
+            visible_tiles=self.visible_animated_tiles
         )
+        # Runs once the window is shown
+        self.animation_controller.pause("hidden")
         
         # Add tile patterns dictionary
         self.tile_patterns = {
@@ -157,9 +158,31 @@ class TileMapEditor(QWidget):
         self.map_window_width = DEFAULT_MAP_WIDTH
         self.map_window_height = DEFAULT_MAP_HEIGHT
         self.nav_speed = DEFAULT_NAV_SPEED
+        # Map cell under the mouse, patterns are drawn here
+        self.cursor_cell = (0, 0)
+        
+        # Level files given on the command line, switched with Ctrl+PgDown/Ctrl+PgUp
+        self.level_files = []
+        self.level_index = 0
+        
+        # Drag painting is recorded as one undo step per stroke
+        self.stroke_active = False
+        # Last map cell painted in the stroke, the next one is joined by a line
+        self.last_paint_cell = None
+        
+        # Edits are applied at once, the map is redrawn at most once per display refresh
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setTimerType(Qt.PreciseTimer)
+        self.frame_timer.timeout.connect(self.update_map_display)
+        
+        # Initial loading, or after the first paint of the window (see paintEvent)
+        self.assets_pending = defer_assets
+        if not defer_assets:
+            self.load_assets()
         
-        # Initial loading
-        self.load_assets()
+        # Show changes of the tileset files without reloading
+        self.tile_manager.watch(self.on_tiles_changed)
         
         # Set up keyboard shortcuts
         self.setup_shortcuts()
@@ -169,14 +192,49 @@ class TileMapEditor(QWidget):
         
     def open_unit_editor(self):
         """Open the unit editor dialog"""
+        from unit_editor import UnitEditor
+        
         editor = UnitEditor(self, self.map_data)
         # switch focus
         #editor.show()
         # unit editor has focus until close 
-        editor.exec_()
-        #
+        self.exec_unit_editor(editor)
+    
+    def exec_unit_editor(self, editor):
+        """Run a unit editor dialog, animations pause while it is open"""
+        self.animation_controller.pause("modal")
+        try:
+            editor.exec_()
+        finally:
+            self.animation_controller.resume("modal")
         # Update the display when the dialog closes
         self.update_map_display()
+    
+    def paintEvent(self, event):
+        """Load the tilesets once the empty window is painted, when they are deferred"""
+        super().paintEvent(event)
+        if self.assets_pending:
+            self.assets_pending = False
+            QTimer.singleShot(0, self.load_assets)
+    
+    def changeEvent(self, event):
+        """Pause animations while the window is minimized"""
+        if event.type() == QEvent.WindowStateChange:
+            if self.isMinimized():
+                self.animation_controller.pause("minimized")
+            else:
+                self.animation_controller.resume("minimized")
+        super().changeEvent(event)
+    
+    def hideEvent(self, event):
+        """Pause animations while the window is hidden"""
+        self.animation_controller.pause("hidden")
+        super().hideEvent(event)
+    
+    def showEvent(self, event):
+        """Resume animations when the window is shown again"""
+        self.animation_controller.resume("hidden")
+        super().showEvent(event)
         
     def init_ui(self):
         """Initialize the user interface"""
@@ -184,11 +242,18 @@ class TileMapEditor(QWidget):
         self.canvas = MapCanvasWidget(self)
         self.canvas.window_width = DEFAULT_MAP_WIDTH
         self.canvas.window_height = DEFAULT_MAP_HEIGHT
+        # Full size before the map is drawn, the view can be scrolled before the tilesets load
+        self.canvas.setFixedSize(DEFAULT_MAP_WIDTH * TILE_SIZE, DEFAULT_MAP_HEIGHT * TILE_SIZE)
         
         # Wrap the canvas in a scroll area
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidget(self.canvas)
         self.scroll_area.setWidgetResizable(False)
+        self.scroll_area.horizontalScrollBar().valueChanged.connect(self.on_scroll)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        
+        # Profiler statistics over the top left corner of the map
+        self.profiler_hud = ProfilerHud(self.scroll_area.viewport())
                
         # Tile palette
         self.palette = TilesetPaletteWidget(parent=self)
@@ -207,6 +272,10 @@ class TileMapEditor(QWidget):
         self.unitov_cb.setChecked(True)
         self.unitov_cb.stateChanged.connect(self.toggle_unit_overlay)
         
+        # Profiler HUD
+        self.profiler_cb = QCheckBox("Show Profiler")
+        self.profiler_cb.stateChanged.connect(self.toggle_profiler)
+        
         # Buttons
         load_button = QPushButton("Choose Tileset Directory")
         load_button.clicked.connect(self.choose_tileset_directory)
@@ -214,8 +283,18 @@ class TileMapEditor(QWidget):
         load_binary_map_button = QPushButton("Load Binary Map")
         load_binary_map_button.clicked.connect(self.load_binary_map_dialog)
         
-        save_binary_button = QPushButton("Save Binary Map")
-        save_binary_button.clicked.connect(self.save_binary_map)
+        # Enabled when a level is loaded, the level format comes from the file
+        self.save_binary_button = QPushButton("Save Binary Map")
+        self.save_binary_button.clicked.connect(self.save_binary_map)
+        self.save_binary_button.setEnabled(False)
+        
+        import_image_button = QPushButton("Import Map Image")
+        import_image_button.clicked.connect(self.import_map_image_dialog)
+        
+        # Session recording, replayed with session.py
+        self.recorder = None
+        self.record_button = QPushButton("Record Session")
+        self.record_button.clicked.connect(self.toggle_recording)
         
         # Info display
         self.info_label = QLabel("Cursor: 0,0 Tile: None")
@@ -225,9 +304,12 @@ class TileMapEditor(QWidget):
         buttons.addWidget(self.tileset_combo)
         buttons.addWidget(load_button)
         buttons.addWidget(load_binary_map_button)
-        buttons.addWidget(save_binary_button)
+        buttons.addWidget(self.save_binary_button)
+        buttons.addWidget(import_image_button)
+        buttons.addWidget(self.record_button)
         buttons.addWidget(self.animate_cb)
         buttons.addWidget(self.unitov_cb)
+        buttons.addWidget(self.profiler_cb)
         buttons.addWidget(self.info_label)
         
         # Main layout
@@ -248,35 +330,71 @@ class TileMapEditor(QWidget):
         """Set up keyboard shortcuts"""
         QShortcut(QKeySequence("Ctrl+Z"), self, self.undo)
         QShortcut(QKeySequence("Ctrl+Y"), self, self.redo)
+        QShortcut(QKeySequence("F12"), self, self.profiler_cb.toggle)
+        QShortcut(QKeySequence("Ctrl+PgDown"), self, lambda: self.open_next_level(1))
+        QShortcut(QKeySequence("Ctrl+PgUp"), self, lambda: self.open_next_level(-1))
         self.setFocusPolicy(Qt.StrongFocus)
     
+    @timed("load_assets")
     def load_assets(self):
         """Load tilesets and initialize the editor"""
         # Load tilesets
         tileset_files = self.tile_manager.scan_tileset_directory()
+        # The first tileset is loaded below, not by currentIndexChanged
+        self.tileset_combo.blockSignals(True)
         self.tileset_combo.clear()
         self.tileset_combo.addItems(tileset_files)
+        self.tileset_combo.blockSignals(False)
         
         # Load animated tileset
         self.tile_manager.load_animated_tileset()
+        self.map_data.track_tiles(self.tile_manager.animated_tiles)
+        self.animation_controller.set_animations(self.tile_manager.animation_timing())
         
         # Load first tileset if available
         if tileset_files:
             self.tile_manager.load_tileset(tileset_files[0])
-            self.palette.update_palette(self.tile_manager.tiles)
+            self.palette.update_palette(self.tile_manager.atlases[TILES_ATLAS],
+                                        self.tile_manager.tile_rects)
+        
+        # Decode the other tilesets in the background for fast switching
+        self.tile_manager.preload_tilesets()
         
         # Update map display
-        self.update_map_display()
+        self.update_map_display(full=True)
     
     def on_tileset_changed(self, index):
         """Handle tileset selection change"""
         if 0 <= index < len(self.tile_manager.tileset_files):
             self.tile_manager.load_tileset(self.tile_manager.tileset_files[index])
-            self.palette.update_palette(self.tile_manager.tiles)
-            self.update_map_display()
+            self.palette.update_palette(self.tile_manager.atlases[TILES_ATLAS],
+                                        self.tile_manager.tile_rects)
+            self.update_map_display(full=True)
+    
+    def on_tiles_changed(self, tile_ids):
+        """Redraw the palette entries and map cells of tiles changed on disk"""
+        if tile_ids is None:
+            # A tileset changed its size
+            self.palette.update_palette(self.tile_manager.atlases[TILES_ATLAS],
+                                        self.tile_manager.tile_rects)
+            self.update_map_display(full=True)
+            return
+        self.palette.update_tiles(tile_ids)
+        self.map_data.mark_dirty(self.map_data.cells_with_tiles(tile_ids))
+        self.update_map_display()
     
-    def update_map_display(self):
-        """Update the map canvas display"""
+    def update_map_display(self, full=False):
+        """Update the map canvas display
+        
+        Only the cells changed in the map data are redrawn, unless full is set.
+        """
+        # This frame includes any scheduled one
+        self.frame_timer.stop()
+        
+        dirty = self.map_data.take_dirty()
+        if full:
+            dirty = None
+        
         self.canvas.window_x = self.map_window_x
         self.canvas.window_y = self.map_window_y
         self.canvas.window_width = self.map_window_width
@@ -284,29 +402,74 @@ class TileMapEditor(QWidget):
         
         # Update the canvas with current state
         self.canvas.update_canvas(
-            self.map_data.data,
+            self.map_data,
             self.tile_manager,
-            self.map_data.unit_positions,
-            self.animation_controller.get_state(),
+            self.map_data.units,
             self.animation_controller.is_enabled(),
             self.canvas.show_unit_overlay,
+            dirty,
         )
+        
+        # Edits and scrolling can bring other animated tiles on screen
+        self.animation_controller.refresh()
+    
+    def schedule_frame(self):
+        """Redraw the changed cells with the next display refresh"""
+        if not self.frame_timer.isActive():
+            screen = self.windowHandle().screen() if self.windowHandle() else QApplication.primaryScreen()
+            refresh_rate = screen.refreshRate() if screen else 0
+            self.frame_timer.start(int(1000 / refresh_rate) if refresh_rate > 0 else 16)
+    
+    def visible_map_rect(self):
+        """Get (x, y, width, height) of the map tiles visible in the scroll area"""
+        left = self.scroll_area.horizontalScrollBar().value()
+        top = self.scroll_area.verticalScrollBar().value()
+        viewport = self.scroll_area.viewport()
+        x = left // TILE_SIZE + self.map_window_x
+        y = top // TILE_SIZE + self.map_window_y
+        width = (left + viewport.width() - 1) // TILE_SIZE + self.map_window_x - x + 1
+        height = (top + viewport.height() - 1) // TILE_SIZE + self.map_window_y - y + 1
+        return x, y, width, height
     
-    def on_animation_update(self, anim_state):
-        """Callback when animation state updates"""
+    def on_scroll(self, value):
+        """Animate the tiles scrolled into view"""
+        self.animation_controller.refresh()
+    
+    def visible_animated_tiles(self):
+        """Get the animated tile ids on screen"""
+        tiles = self.map_data.tiles
+        return {tiles[position] for position in
+                self.map_data.tracked_cells_in_rect(*self.visible_map_rect())}
+    
+    def on_animation_update(self, frames):
+        """Callback when animated tiles change frame"""
+        self.tile_manager.set_frames(frames)
+        # Only the animated cells on screen with a new frame change
+        tiles = self.map_data.tiles
+        cells = [position for position in
+                 self.map_data.tracked_cells_in_rect(*self.visible_map_rect())
+                 if tiles[position] in frames]
+        self.map_data.mark_dirty(cells)
         self.update_map_display()
     
     def toggle_animations(self, state):
         """Enable or disable animations"""
         self.animation_controller.set_enabled(state == Qt.Checked)
+        # Switch between still tiles and animation frames everywhere
+        self.map_data.mark_dirty(self.map_data.tracked_cells)
+        self.update_map_display()
 
     def toggle_unit_overlay(self, state):
         """Enable or unit overlay"""
         self.canvas.show_unit_overlay = bool(state)
-        self.update_map_display() 
+        self.update_map_display(full=True)
         #self.canvas.update()
         #self.update()  # Trigger a repaint
     
+    def toggle_profiler(self, state):
+        """Show or hide the profiler HUD, the profiler records while it is shown"""
+        self.profiler_hud.set_active(state == Qt.Checked)
+    
     def on_tile_selected(self, index):
         """Handle tile selection in palette"""
         self.palette.selected_tile = index
@@ -320,15 +483,23 @@ class TileMapEditor(QWidget):
         map_x = x + self.map_window_x
         map_y = y + self.map_window_y
         
+        if event.buttons() in (Qt.LeftButton, Qt.RightButton):
+            self.begin_stroke()
+        
         if event.buttons() == Qt.LeftButton:
             # Left click: place selected tile
             new_tile = self.palette.selected_tile
-            if self.map_data.set_tile(map_x, map_y, new_tile):
-                self.update_map_display()
         elif event.buttons() == Qt.RightButton:
             # Right click: erase tile
-            if self.map_data.set_tile(map_x, map_y, -1):
-                self.update_map_display()
+            new_tile = EMPTY_TILE
+        else:
+            return
+        
+        # Fill the cells skipped between two drag events
+        last_x, last_y = self.last_paint_cell or (map_x, map_y)
+        self.last_paint_cell = (map_x, map_y)
+        if self.map_data.set_line(last_x, last_y, map_x, map_y, new_tile):
+            self.schedule_frame()
     
     def handle_canvas_move(self, event):
         """Handle mouse movement over the canvas"""
@@ -339,11 +510,31 @@ class TileMapEditor(QWidget):
         
         # Update cursor position display
         if (0 <= map_x < DEFAULT_MAP_WIDTH and 0 <= map_y < DEFAULT_MAP_HEIGHT):
-            self.info_label.setText(f"Cursor: {map_x},{map_y} Tile: {self.palette.selected_tile}")
+            self.cursor_cell = (map_x, map_y)
+            text = f"Cursor: {map_x},{map_y} Tile: {self.palette.selected_tile}"
+            if self.info_label.text() != text:
+                self.info_label.setText(text)
         
         # Handle drag painting
         if event.buttons() in (Qt.LeftButton, Qt.RightButton):
             self.handle_canvas_click(event)
+        elif event.buttons() == Qt.NoButton:
+            # The release may have gone to a popup menu
+            self.end_stroke()
+    
+    def begin_stroke(self):
+        """Start collecting drag painting into one undo step"""
+        if not self.stroke_active:
+            self.stroke_active = True
+            self.last_paint_cell = None
+            self.map_data.begin_transaction()
+    
+    def end_stroke(self):
+        """Finish the current drag painting stroke"""
+        if self.stroke_active:
+            self.stroke_active = False
+            self.last_paint_cell = None
+            self.map_data.commit_transaction()
     
     def navigate(self, dx, dy):
         """Move the view window by dx, dy tiles"""
@@ -383,52 +574,118 @@ class TileMapEditor(QWidget):
         if path:
             self.load_binary_map(path)
     
+    def import_map_image_dialog(self):
+        """Replace the map tiles with the tiles recognized in a map image"""
+        from tile_index import TileIndex, image_to_tiles
+        
+        path, _ = QFileDialog.getOpenFileName(self, "Import Map Image", "", "Images (*.png)")
+        if path:
+            image = QImage(path)
+            if image.isNull():
+                self.info_label.setText("Error reading image")
+                return
+            index = TileIndex.from_tile_manager(self.tile_manager)
+            tiles = image_to_tiles(image, index, self.map_data.width, self.map_data.height)
+            # One undo step, units are kept
+            self.end_stroke()
+            self.map_data.replace_tiles(tiles)
+            self.update_map_display()
+            self.info_label.setText(f"Imported {os.path.basename(path)}")
+    
+    def toggle_recording(self):
+        """Start recording a session or stop and save it"""
+        from session import SessionRecorder, save_session
+        
+        if self.recorder is None:
+            self.recorder = SessionRecorder(self)
+            self.recorder.start()
+            self.record_button.setText("Stop Recording")
+            self.info_label.setText("Recording session")
+            return
+        session = self.recorder.stop()
+        self.recorder = None
+        self.record_button.setText("Record Session")
+        path, _ = QFileDialog.getSaveFileName(self, "Save Session", "", "Sessions (*.json)")
+        if path:
+            try:
+                save_session(session, path)
+                self.info_label.setText(f"Session saved to {os.path.basename(path)}")
+            except OSError as e:
+                print(f"Error saving session '{path}': {e}")
+                self.info_label.setText("Error saving session")
+    
+    def on_units_edited(self):
+        """Update the display after a change in the unit editor"""
+        if self.recorder is not None:
+            self.recorder.record_units()
+        self.update_map_display()
+    
     def load_binary_map(self, filepath):
-        """Load a binary map file"""
+        """Load a binary map file, it replaces the map, units and undo history"""
+        self.end_stroke()
         if self.map_data.load_binary(filepath):
             # Reset view position
             self.map_window_x = 0
             self.map_window_y = 0
-            self.update_map_display()
+            self.canvas.hover_cell = None
+            self.update_map_display(full=True)
             self.info_label.setText(f"Map loaded from {os.path.basename(filepath)}")
             self.setWindowTitle(f"{os.path.basename(filepath)}")
+            self.save_binary_button.setEnabled(True)
         else:
             self.info_label.setText(f"Error loading map")
     
+    def set_level_files(self, paths):
+        """Open the first of a list of level files, see open_next_level()"""
+        self.level_files = list(paths)
+        self.level_index = 0
+        if self.level_files:
+            self.load_binary_map(self.level_files[0])
+    
+    def open_next_level(self, step):
+        """Open the next (step 1) or previous (step -1) level file of the list"""
+        if len(self.level_files) > 1:
+            self.level_index = (self.level_index + step) % len(self.level_files)
+            self.load_binary_map(self.level_files[self.level_index])
+    
+    def scroll_to_cell(self, x, y):
+        """Scroll the map view so that map tile (x, y) is at the top left"""
+        self.scroll_area.horizontalScrollBar().setValue((x - self.map_window_x) * TILE_SIZE)
+        self.scroll_area.verticalScrollBar().setValue((y - self.map_window_y) * TILE_SIZE)
+    
     def undo(self):
         """Undo last map edit"""
+        self.end_stroke()
+        if self.recorder is not None and not self.recorder.can_undo():
+            self.info_label.setText("Undo stops at the start of the recording")
+            return
         if self.map_data.undo():
             self.update_map_display()
             self.info_label.setText("Undo")
     
     def redo(self):
         """Redo last undone edit"""
+        self.end_stroke()
+        if self.recorder is not None and not self.recorder.can_redo():
+            self.info_label.setText("Redo stops at the start of the recording")
+            return
         if self.map_data.redo():
             self.update_map_display()
             self.info_label.setText("Redo")
     
     def draw_tile_pattern(self, pattern_type):
         """Draw a pattern of tiles at the current cursor position"""
-        # Get current cursor position from info label
-        info_text = self.info_label.text()
-        if "Cursor:" not in info_text:
-            return  # No valid cursor position
-        
-        try:
-            coords = info_text.split("Cursor: ")[1].split(" Tile:")[0].split(",")
-            map_x = int(coords[0])
-            map_y = int(coords[1])
-        except (IndexError, ValueError):
-            return  # Invalid cursor position format
+        map_x, map_y = self.cursor_cell
         
         # Check if this is a special pattern with specific tile IDs
         if pattern_type in self.special_tile_patterns:
             # Special pattern with predefined tile IDs
             positions = self.special_tile_patterns[pattern_type]
             
-            # Place each tile with its specific ID
-            for dx, dy, tile_id in positions:
-                self.map_data.set_tile(map_x + dx, map_y + dy, tile_id)
+            # Place each tile with its specific ID (one undo step)
+            with self.map_data.transaction():
+                for dx, dy, tile_id in positions:
+                    self.map_data.set_tile(map_x + dx, map_y + dy, tile_id)
                 
         else:
             # Regular pattern using currently selected tile
@@ -439,9 +696,10 @@ class TileMapEditor(QWidget):
             # or default to a single tile if pattern not found
             positions = self.tile_patterns.get(pattern_type, [(0, 0)])
             
-            # Place each tile in the pattern with the same tile ID
-            for dx, dy in positions:
-                self.map_data.set_tile(map_x + dx, map_y + dy, tile_id)
+            # Place each tile in the pattern with the same tile ID (one undo step)
+            with self.map_data.transaction():
+                for dx, dy in positions:
+                    self.map_data.set_tile(map_x + dx, map_y + dy, tile_id)
     
         # Update the display
         self.update_map_display()
@@ -465,8 +723,7 @@ class TileMapEditor(QWidget):
         # Quick tile selection with number keys (when no modifier is pressed)
         elif Qt.Key_0 <= key <= Qt.Key_9 and modifiers == Qt.NoModifier:
             tile_num = key - Qt.Key_0
-            if tile_num < len(self.tile_manager.tiles):
-                self.palette.set_selected_tile(tile_num)
+            self.palette.set_selected_tile(tile_num)
         # Pattern drawing with defined key bindings and modifiers
         elif (key, modifiers) in self.pattern_keys:
             pattern_name = self.pattern_keys[(key, modifiers)]
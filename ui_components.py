@@ -1,194 +1,165 @@
 # ui components
-from PyQt5.QtWidgets import QLabel, QScrollArea
+from PyQt5.QtWidgets import QLabel, QScrollArea, QToolTip, QWidget, QApplication
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QPointF, QRect, QEvent, QTimer
 
-from constants import TILE_SIZE, GRID_COLOR, SELECTION_COLOR, TILE_FONT_COLOR, SHOW_TILE_NUMBER
-from constants import PLAYER_COLOR, ROBOT_COLOR, DOOR_COLOR, ITEM_COLOR, PALETTE_COLS
+from constants import TILE_SIZE, EMPTY_TILE, SELECTION_COLOR, TILE_FONT_COLOR, SHOW_TILE_NUMBER
+from constants import PALETTE_GRID_COLOR, PALETTE_COLS, PROFILER_HUD_INTERVAL, TABLE_SIZE
+from map_renderer import MapRenderer
+from profiler import profiler, timed
 
 class TilesetPaletteWidget(QLabel):
-    """Widget showing the available tiles that can be selected"""
+    """Widget showing the available tiles that can be selected
+    
+    The tiles, numbers and grid are rendered once per tileset into the label
+    pixmap, the selection box is drawn on top in paintEvent.
+    """
     
     def __init__(self, cols=PALETTE_COLS, parent=None):
         super().__init__(parent)
         self.cols = cols
         self.selected_tile = 0
         self.tile_size = TILE_SIZE
-        self.tiles = []
+        self.atlas = None
+        self.tile_rects = []
+        self.rows = 1
+        # Rendered palette without the selection box
+        self.base = None
+        self.number_font = QFont("Arial", 10)
+        self.number_font.setWeight(QFont.Bold)
     
-    def update_palette(self, tiles):
-        """Update the palette with new tiles"""
-        self.tiles = tiles
-        rows = max(1, (len(tiles) + self.cols - 1) // self.cols)  # Ceiling division
+    @timed("update_palette")
+    def update_palette(self, atlas, tile_rects):
+        """Render the palette with the tiles of an atlas pixmap"""
+        self.atlas = atlas
+        self.tile_rects = tile_rects
+        self.rows = max(1, (len(tile_rects) + self.cols - 1) // self.cols)  # Ceiling division
         
         # Create image to draw on
-        image = QImage(self.cols * self.tile_size, rows * self.tile_size, QImage.Format_ARGB32)
+        image = QImage(self.cols * self.tile_size, self.rows * self.tile_size, QImage.Format_ARGB32)
         image.fill(Qt.transparent)
         painter = QPainter(image)
+        painter.setRenderHint(QPainter.TextAntialiasing)
+        painter.setFont(self.number_font)
         
         # Draw all tiles
-        for i, tile in enumerate(self.tiles):
-            if i >= self.cols * rows:
-                break
-                
-            x = (i % self.cols) * self.tile_size
-            y = (i // self.cols) * self.tile_size
-
-            # Draw tile
-            painter.drawPixmap(x, y, tile)
-            
-            # Draw the index number on each tile
-            # Color and SHOW_TILE_NUMBER
-            if i % 5 == 0 and SHOW_TILE_NUMBER: 
-                painter.setRenderHint(QPainter.TextAntialiasing)
-                painter.setPen(QColor(*TILE_FONT_COLOR))  # White text
-                bold_font = QFont("Arial", 10)
-                bold_font.setWeight(QFont.Bold)
-                painter.setFont(bold_font)
-                #painter.setFont(QFont("Arial", 8))
-            
-                # Draw with black outline for better visibility
-                painter.setPen(QColor(0, 0, 0, 255))
-                painter.drawText(x+2, y+12, str(i))
-                painter.setPen(QColor(*TILE_FONT_COLOR))
-                painter.drawText(x+1, y+11, str(i))
-            
-            # Draw grid lines around all tiles
-            painter.setPen(QColor(*GRID_COLOR))
-    
-            # Draw horizontal grid lines
-            for y in range(rows + 1):
-                painter.drawLine(0, y * self.tile_size, self.cols * self.tile_size, y * self.tile_size)
+        for i in range(min(len(self.tile_rects), self.cols * self.rows)):
+            self._draw_tile(painter, i)
+        
+        self._draw_grid(painter)
+        painter.end()
+        
+        # Update widget
+        self.base = QPixmap.fromImage(image)
+        self.setPixmap(self.base)
+        self.setFixedSize(self.cols * self.tile_size, self.rows * self.tile_size)
     
-            # Draw vertical grid lines
-            for x in range(self.cols + 1):
-                painter.drawLine(x * self.tile_size, 0, x * self.tile_size, rows * self.tile_size)
+    def update_tiles(self, tile_ids):
+        """Redraw single tiles of the rendered palette after their pixels changed"""
+        if self.base is None:
+            return
+        painter = QPainter(self.base)
+        painter.setRenderHint(QPainter.TextAntialiasing)
+        painter.setFont(self.number_font)
+        for i in tile_ids:
+            if 0 <= i < len(self.tile_rects):
+                rect = self.tile_rect(i)
+                painter.setClipRect(rect)
+                painter.setCompositionMode(QPainter.CompositionMode_Source)
+                painter.fillRect(rect, Qt.transparent)
+                painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+                self._draw_tile(painter, i)
+                self._draw_grid(painter)
+        painter.end()
+        self.setPixmap(self.base)
     
-            # Draw selection box around selected tile - draw this AFTER the grid to make it visible
-            if 0 <= self.selected_tile < len(self.tiles):
-                x = (self.selected_tile % self.cols) * self.tile_size
-                y = (self.selected_tile // self.cols) * self.tile_size
-                painter.setPen(QColor(SELECTION_COLOR))
-                painter.drawRect(x, y, self.tile_size - 1, self.tile_size - 1)
+    def _draw_tile(self, painter, i):
+        """Draw a tile and its number"""
+        x = (i % self.cols) * self.tile_size
+        y = (i // self.cols) * self.tile_size
+
+        # Draw tile
+        painter.drawPixmap(QPointF(x, y), self.atlas, self.tile_rects[i])
+        
+        # Draw the index number on each tile
+        # Color and SHOW_TILE_NUMBER
+        if i % 5 == 0 and SHOW_TILE_NUMBER: 
+            # Draw with black outline for better visibility
+            painter.setPen(QColor(0, 0, 0, 255))
+            painter.drawText(x+2, y+12, str(i))
+            painter.setPen(QColor(*TILE_FONT_COLOR))
+            painter.drawText(x+1, y+11, str(i))
     
-            # Draw selection box around selected tile
-            #if i == self.selected_tile:
-            #    painter.setPen(QColor(SELECTION_COLOR))
-            #    painter.drawRect(x, y, self.tile_size - 1, self.tile_size - 1)
+    def _draw_grid(self, painter):
+        """Draw grid lines around all tiles"""
+        painter.setPen(QColor(*PALETTE_GRID_COLOR))
         
-        painter.end()
+        # Draw horizontal grid lines
+        for y in range(self.rows + 1):
+            painter.drawLine(0, y * self.tile_size, self.cols * self.tile_size, y * self.tile_size)
         
-        # Update widget
-        self.setPixmap(QPixmap.fromImage(image))
-        self.setFixedSize(self.cols * self.tile_size, rows * self.tile_size)
+        # Draw vertical grid lines
+        for x in range(self.cols + 1):
+            painter.drawLine(x * self.tile_size, 0, x * self.tile_size, self.rows * self.tile_size)
+    
+    def tile_rect(self, index):
+        """Get the widget rectangle of a tile"""
+        return QRect((index % self.cols) * self.tile_size, (index // self.cols) * self.tile_size,
+                     self.tile_size, self.tile_size)
+    
+    def select(self, index):
+        """Move the selection box, only the old and new tile are repainted"""
+        if index != self.selected_tile:
+            self.update(self.tile_rect(self.selected_tile))
+            self.selected_tile = index
+            self.update(self.tile_rect(index))
+    
+    def selectable(self, index):
+        """Check if a tile can be selected, levels only hold tile ids below TABLE_SIZE"""
+        return 0 <= index < min(len(self.tile_rects), TABLE_SIZE)
     
     def set_selected_tile(self, index):
         """Set the selected tile by index"""
-        if 0 <= index < len(self.tiles):
-            self.selected_tile = index
-            self.update_palette(self.tiles)
+        if self.selectable(index):
+            self.select(index)
+    
+    def paintEvent(self, event):
+        """Draw the cached palette and the selection box on top"""
+        super().paintEvent(event)
+        
+        # Draw selection box around selected tile - draw this AFTER the grid to make it visible
+        if 0 <= self.selected_tile < len(self.tile_rects):
+            painter = QPainter(self)
+            painter.setPen(QColor(SELECTION_COLOR))
+            painter.drawRect(self.tile_rect(self.selected_tile).adjusted(0, 0, -1, -1))
+            painter.end()
     
     def mousePressEvent(self, event):
         """Handle mouse clicks to select tiles"""
         x = event.pos().x() // self.tile_size
         y = event.pos().y() // self.tile_size
         index = y * self.cols + x
-        if 0 <= index < len(self.tiles):
-            self.selected_tile = index
-            self.update_palette(self.tiles)
+        if self.selectable(index):
+            self.select(index)
             
             # Notify parent of selection change
             if hasattr(self.parent(), "on_tile_selected"):
                 self.parent().on_tile_selected(index)
 
 
-class MapCanvasWidget(QLabel):
-    """Widget showing the map with tiles and units"""
+class MapCanvasWidget(QWidget, MapRenderer):
+    """Widget showing the map with tiles and units
+    
+    The view window and the state drawn by paintEvent are MapRenderer attributes,
+    the QWidget constructor initializes the MapRenderer too.
+    """
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_editor = parent  
-        self.tile_size = TILE_SIZE
-        self.window_x = 0  # View window position
-        self.window_y = 0
-        self.window_width = 0
-        self.window_height = 0
         self.setMouseTracking(True)
-        self.show_unit_overlay = True
-        
-    # Add the new helper methods here, right after __init__
-    def draw_filled_rectangle_with_border(self, painter, x, y, width, height, fill_color, border_color, alpha=128):
-        """Draw a rectangle with semi-transparent fill and border"""
-        # Set up semi-transparent fill color
-        fill = QColor(fill_color)
-        fill.setAlpha(alpha)
-        
-        # Fill the rectangle
-        painter.fillRect(x, y, width, height, fill)
-        
-        # Draw the border
-        painter.setPen(QColor(border_color))
-        painter.drawRect(x, y, width, height)
-
-    def draw_filled_ellipse_with_border(self, painter, x, y, width, height, fill_color, border_color, alpha=128):
-        """Draw an ellipse with semi-transparent fill and border"""
-        # Save current brush and pen
-        old_brush = painter.brush()
-        old_pen = painter.pen()
-        
-        # Set up semi-transparent fill
-        fill = QColor(fill_color)
-        fill.setAlpha(alpha)
-        painter.setBrush(fill)
-        
-        # Set up border
-        painter.setPen(QColor(border_color))
-        
-        # Draw the ellipse
-        painter.drawEllipse(x, y, width, height)
-        
-        # Restore original brush and pen
-        painter.setBrush(old_brush)
-        painter.setPen(old_pen)
-    
-    def draw_centered_text(self, painter, x, y, width, height, text, text_color=Qt.white, font_size_adjustment=0):
-        """Draw text centered in the given rectangle with the specified styling
-        
-        Args:
-            painter: QPainter object
-            x, y: Top-left corner of the rectangle to center text in
-            width, height: Dimensions of the rectangle
-            text: Text to display
-            text_color: Color for the text (default: white)
-            font_size_adjustment: Adjustment to font size (default: -2)
-        """
-        # Save original font
-        original_font = painter.font()
-        
-        # Create a smaller font
-        smaller_font = QFont(original_font)
-        if font_size_adjustment != 0:
-            smaller_font.setPointSize(max(6, original_font.pointSize() + font_size_adjustment))
-        
-        # Apply the font
-        painter.setFont(smaller_font)
-        
-        # Set text color
-        painter.setPen(text_color)
-        
-        # Calculate centered position
-        text_width = painter.fontMetrics().horizontalAdvance(text)
-        text_height = painter.fontMetrics().height()
-        
-        text_x = x + (width - text_width) / 2
-        text_y = y + (height + text_height) / 2 - 2  # -2 for visual adjustment
-        
-        # Draw the text
-        painter.drawText(int(text_x), int(text_y), text)
+        self.hover_cell = None  # Map tile of the last unit tooltip
         
-        # Restore original font
-        painter.setFont(original_font)
-    
     def contextMenuEvent(self, event):
         """Show context menu when right-clicking on the map"""
         # Get map coordinates from screen position
@@ -203,6 +174,17 @@ class MapCanvasWidget(QLabel):
         add_unit_action.triggered.connect(lambda: self.place_unit_at(x, y))
         menu.addAction(add_unit_action)
         
+        # Edit the units under the cursor directly
+        from unit_editor import UnitTypeInfo
+        units = self.parent_editor.map_data.units
+        for unit_id in self.units_at(x, y):
+            unit_type = units.types[unit_id]
+            edit_unit_action = QAction(
+                f"Edit Unit {unit_id}: {UnitTypeInfo.get_type_name(unit_type)}", self)
+            edit_unit_action.triggered.connect(
+                lambda checked, uid=unit_id: self.edit_unit(uid))
+            menu.addAction(edit_unit_action)
+        
         # Show menu
         menu.exec_(event.globalPos())
 
@@ -223,137 +205,82 @@ class MapCanvasWidget(QLabel):
         # switch focus
         #editor.show()
         # unit editor has focus until close 
-        editor.exec_()
+        self.parent_editor.exec_unit_editor(editor)
+    
+    def edit_unit(self, unit_id):
+        """Open unit editor with the given unit selected"""
+        from unit_editor import UnitEditor
         
+        editor = UnitEditor(self.parent_editor, self.parent_editor.map_data)
+        editor.select_unit(unit_id)
+        self.parent_editor.exec_unit_editor(editor)
+    
+    def units_at(self, x, y):
+        """Get the ids of the shown units (type not 0) on map tile (x, y)"""
+        units = self.parent_editor.map_data.units
+        return [unit_id for unit_id in units.ids_at(x, y) if units.types[unit_id] != 0]
+    
+    def update_unit_tooltip(self, event):
+        """Show type and properties of the units under the cursor"""
+        x = event.pos().x() // self.tile_size + self.window_x
+        y = event.pos().y() // self.tile_size + self.window_y
+        if (x, y) == self.hover_cell:
+            return
+        self.hover_cell = (x, y)
         
+        unit_ids = self.units_at(x, y) if self.show_unit_overlay else []
+        if not unit_ids:
+            QToolTip.hideText()
+            return
         
-        # Update the map display
-        self.parent_editor.update_map_display()    
+        from unit_editor import UnitTypeInfo
+        lines = []
+        for unit_id in unit_ids:
+            _, _, unit_type, a, b, c, d, h = self.parent_editor.map_data.units.get(unit_id)
+            lines.append(f"Unit {unit_id}: {UnitTypeInfo.get_type_name(unit_type)} ({unit_type})\n"
+                         f"A: {a}  B: {b}  C: {c}  D: {d}  H: {h}")
+        QToolTip.showText(event.globalPos(), "\n".join(lines), self)
     
-    def update_canvas(self, map_data, tile_manager, unit_positions, anim_state, show_animations, show_unit_overlay):
-        """Redraw the map with current tiles and units"""
-        # Set the size based on the visible window
-        width = self.window_width
-        height = self.window_height
-        
-        self.setFixedSize(width * self.tile_size, height * self.tile_size)
-        image = QImage(width * self.tile_size, height * self.tile_size, QImage.Format_ARGB32)
-        image.fill(Qt.white)
-        painter = QPainter(image)
+    def update_canvas(self, map_data, tile_manager, units, show_animations, show_unit_overlay, dirty=None):
+        """Schedule a redraw of the map with current tiles and units
         
-        # Draw tiles
-        for y in range(height):
-            map_y = y + self.window_y
-            if map_y >= len(map_data):
-                continue
-
-            for x in range(width):
-                map_x = x + self.window_x
-                if map_x >= len(map_data[0]):
-                    continue
-
-                # Get tile ID at this position
-                tile_id = map_data[map_y][map_x]
-                if tile_id != -1:
-                    # Get the pixmap for this tile (considering animation)
-                    pixmap = tile_manager.get_tile_pixmap(tile_id, anim_state, show_animations)
-                    if pixmap:
-                        painter.drawPixmap(x * self.tile_size, y * self.tile_size, pixmap)
+        dirty is a set of flat map positions to redraw, None redraws everything.
+        Drawing happens in paintEvent, only for the part of the map on screen.
+        """
+        self.map_data = map_data
+        self.tile_manager = tile_manager
+        self.units = units
+        self.show_animations = show_animations
         
-        # Draw grid
-        painter.setPen(QColor(*GRID_COLOR))
-        for x in range(width + 1):
-            painter.drawLine(x * self.tile_size, 0, x * self.tile_size, height * self.tile_size)
-        for y in range(height + 1):
-            painter.drawLine(0, y * self.tile_size, width * self.tile_size, y * self.tile_size)
+        # Set the size based on the visible window
+        size = (self.window_width * self.tile_size, self.window_height * self.tile_size)
+        if (self.width(), self.height()) != size:
+            self.setFixedSize(*size)
+            dirty = None
         
-        # Draw units
-        self._draw_units(painter, unit_positions)
+        if dirty is None:
+            self.update()
+            return
         
-        painter.end()
-        self.setPixmap(QPixmap.fromImage(image))
+        for position in dirty:
+            map_y, map_x = divmod(position, map_data.width)
+            x = map_x - self.window_x
+            y = map_y - self.window_y
+            if 0 <= x < self.window_width and 0 <= y < self.window_height:
+                self.update(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
     
-    def _draw_units(self, painter, unit_positions):
-        """Draw an overlay showing unit positions"""
-        if not self.show_unit_overlay:
+    @timed("paint_canvas")
+    def paintEvent(self, event):
+        """Draw the tiles, grid and units in the exposed part of the map"""
+        if self.map_data is None:
             return
-        for unit_id, (x, y, unit_type, a, b, c, d, h) in unit_positions.items():
-            # Adjust for the view window position
-            screen_x = (x - self.window_x) * self.tile_size
-            screen_y = (y - self.window_y) * self.tile_size
-            
-            # Skip if outside current view
-            if (screen_x < 0 or screen_y < 0 or 
-                screen_x >= self.window_width * self.tile_size or 
-                screen_y >= self.window_height * self.tile_size):
-                continue
-            
-            # Different styles for different unit types
-            if unit_type == 1:  # Player
-                fill_color = QColor(PLAYER_COLOR)  
-                fill_color.setAlpha(128)
-                painter.fillRect(screen_x + 2, screen_y + 2, 
-                                self.tile_size - 4, self.tile_size - 4, fill_color)
-                self.draw_centered_text(
-                painter,
-                screen_x, screen_y,
-                self.tile_size, self.tile_size, f"P{unit_id}-{unit_type}") 
-                #painter.drawText(screen_x + 5 + 17, screen_y + 16, f"P{unit_id}-{unit_type}")
-            #elif 1 <= unit_id <= 27:  # Robots
-            elif unit_type in [2, 3, 4, 9, 17, 18]:  # Robots
-            #elif 3 <= unit_id <= 3 + 26:  # Robots
-                #painter.setPen(QColor(ROBOT_COLOR))
-                fill_color = QColor(ROBOT_COLOR)  
-                fill_color.setAlpha(128)
-                painter.fillRect(screen_x + 2, screen_y + 2, 
-                                self.tile_size - 4, self.tile_size - 4, fill_color)
-                self.draw_centered_text(
-                painter,
-                screen_x, screen_y,
-                self.tile_size, self.tile_size, f"R{unit_id}-{unit_type}") 
-                #painter.drawText(screen_x + 5 + 17, screen_y + 16, f"R{unit_id-3}-{unit_type}")
-            #elif 32 <= unit_id <= 47:  # Doors
-            elif unit_type in [7, 10, 16, 19, 22]: # Doors and transport
-            #elif 34 <= unit_id <= 34 + 15:  # Door
-                #painter.setPen(QColor(DOOR_COLOR))
-                fill_color = QColor(DOOR_COLOR)  
-                fill_color.setAlpha(128)
-                painter.fillRect(screen_x + 2, screen_y + 2, 
-                                self.tile_size - 4, self.tile_size - 4, fill_color)
-                self.draw_centered_text(
-                painter,
-                screen_x, screen_y,
-                self.tile_size, self.tile_size, f"D{unit_id}-{unit_type}-{c}") 
-            #elif 48 <= unit_id <= 63:  # Items
-            elif unit_type in [128, 129, 130, 131, 132, 133, 134]: # Items
-            #elif 50 <= unit_id <= 50 + 15:  # Items
-                #painter.setPen(QColor(ITEM_COLOR))
-                #painter.drawEllipse(screen_x + 4, screen_y + 4, 
-                #                  self.tile_size - 8, self.tile_size - 8)
-                fill_color = QColor(ITEM_COLOR)  
-                fill_color.setAlpha(128)
-                painter.fillRect(screen_x + 2, screen_y + 2, 
-                                self.tile_size - 4, self.tile_size - 4, fill_color)
-                if unit_type == 128:
-                # if key
-                     self.draw_centered_text(
-                    painter,
-                    screen_x, screen_y,
-                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}-{a}")
-                elif 128 < unit_type <= 134:
-                # if weapon or item
-                    self.draw_centered_text(
-                    painter,
-                    screen_x, screen_y,
-                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}-{a}")
-                else:
-                    self.draw_centered_text(
-                    painter,
-                    screen_x, screen_y,
-                    self.tile_size, self.tile_size, f"I{unit_id}-{unit_type}")
-                
-                                
-                #painter.drawText(screen_x + 5, screen_y + 16, f"I{unit_id-51}-{unit_type}")
+        profiler.begin_frame()
+        painter = QPainter(self)
+        for rect in event.region().rects():
+            painter.setClipRect(rect)
+            self._draw_rect(painter, rect)
+        painter.end()
+        profiler.end_frame()
     
     #def mousePressEvent(self, event):
     #    """Handle mouse press for painting tiles"""
@@ -373,6 +300,7 @@ class MapCanvasWidget(QLabel):
         #    self.parent().handle_canvas_move(event)
         if hasattr(self.parent_editor, "handle_canvas_move"):
             self.parent_editor.handle_canvas_move(event)
+        self.update_unit_tooltip(event)
     
     def mousePressEvent(self, event):
         """Handle mouse press for painting tiles and picking"""
@@ -384,7 +312,7 @@ class MapCanvasWidget(QLabel):
             # Pick the tile at this location
             if 0 <= x < 128 and 0 <= y < 64:
                 tile_id = self.parent_editor.map_data.get_tile(x, y)
-                if tile_id != -1:
+                if tile_id != EMPTY_TILE:
                     # Set as selected tile in palette
                     self.parent_editor.palette.set_selected_tile(tile_id)
         else:
@@ -392,7 +320,108 @@ class MapCanvasWidget(QLabel):
             if hasattr(self.parent_editor, "handle_canvas_click"):
                 self.parent_editor.handle_canvas_click(event)
                 
+    def mouseReleaseEvent(self, event):
+        """Handle mouse release to finish a drag painting stroke"""
+        if hasattr(self.parent_editor, "end_stroke"):
+            self.parent_editor.end_stroke()
+                
    # def mouseMoveEvent(self, event):
    #     """Handle mouse movement for drag painting and position display"""
    #     if hasattr(self.parent_editor, "handle_canvas_move"):
    #         self.parent_editor.handle_canvas_move(event)
+
+
+class ProfilerHud(QLabel):
+    """Profiler statistics shown over the map canvas
+    
+    While active, the profiler records and the input events of the application
+    are reported to it for the input to paint latency. The context menu exports
+    the recording or profiles the next interaction with cProfile.
+    """
+    
+    INPUT_EVENTS = (QEvent.MouseButtonPress, QEvent.MouseMove, QEvent.KeyPress, QEvent.Wheel)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        font = QFont("Monospace", 9)
+        font.setStyleHint(QFont.TypeWriter)
+        self.setFont(font)
+        # Opaque, so updating the HUD does not repaint the canvas below
+        self.setAutoFillBackground(True)
+        self.setStyleSheet("QLabel { background-color: black; color: lime; }")
+        self.setMargin(4)
+        self.timer = QTimer(self)
+        self.timer.setInterval(PROFILER_HUD_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+    
+    def set_active(self, active):
+        """Start recording and show the HUD, or stop and hide it"""
+        profiler.set_enabled(active)
+        app = QApplication.instance()
+        if active:
+            app.installEventFilter(self)
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start()
+        else:
+            app.removeEventFilter(self)
+            self.timer.stop()
+            self.hide()
+    
+    def eventFilter(self, obj, event):
+        """Report input events to the profiler, moves only while dragging"""
+        if event.type() in self.INPUT_EVENTS:
+            if event.type() != QEvent.MouseMove or event.buttons() != Qt.NoButton:
+                profiler.mark_input()
+        return False
+    
+    def refresh(self):
+        """Show the statistics of the last second"""
+        summary = profiler.summary()
+        frame_mean, frame_max = summary["frame"]
+        lines = [f"FPS {summary['fps']:5.1f}   frame {frame_mean:6.2f} ms   max {frame_max:6.2f} ms"]
+        if summary["latency"]:
+            lines.append("input to paint {:6.2f} ms   max {:6.2f} ms".format(*summary["latency"]))
+        else:
+            lines.append("input to paint      -")
+        lines.append(f"allocated blocks per frame {summary['blocks']:8.0f}")
+        for name, (count, mean, maximum) in summary["spans"].items():
+            lines.append(f"{name:<15}{count:5d} x {mean:7.3f} ms   max {maximum:7.3f} ms")
+        if profiler.capture_path:
+            lines.append("cProfile: waiting for the next interaction")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+    
+    def contextMenuEvent(self, event):
+        """Export the recording or capture a cProfile"""
+        from PyQt5.QtWidgets import QMenu, QFileDialog
+        
+        menu = QMenu(self)
+        export_csv = menu.addAction("Export CSV...")
+        export_trace = menu.addAction("Export Chrome Trace...")
+        capture = menu.addAction("Profile Next Interaction...")
+        clear = menu.addAction("Clear")
+        action = menu.exec_(event.globalPos())
+        
+        try:
+            if action == export_csv:
+                path, _ = QFileDialog.getSaveFileName(self, "Export CSV", "profile.csv", "CSV Files (*.csv)")
+                if path:
+                    profiler.export_csv(path)
+            elif action == export_trace:
+                path, _ = QFileDialog.getSaveFileName(self, "Export Chrome Trace", "trace.json",
+                                                      "Trace Files (*.json)")
+                if path:
+                    profiler.export_chrome_trace(path)
+            elif action == capture:
+                path, _ = QFileDialog.getSaveFileName(self, "Save cProfile", "interaction.prof",
+                                                      "Profile Files (*.prof)")
+                if path:
+                    profiler.capture_next(path)
+            elif action == clear:
+                profiler.clear()
+        except OSError as e:
+            print(f"Error exporting profile: {e}")
+        self.refresh()
@@ -182,7 +182,7 @@ class UnitEditor(QDialog):
         super().__init__(parent)
         self.parent = parent
         self.map_data = map_data
-        self.unit_positions = map_data.unit_positions
+        self.units = map_data.units
         self.current_unit_id = None
         
         self.setWindowTitle("Unit Editor")
@@ -353,8 +353,7 @@ class UnitEditor(QDialog):
                 widget.deleteLater()
         
         # Add each unit as a selectable button
-        for unit_id in sorted(self.unit_positions.keys()):
-            x, y, unit_type, a, b, c, d, h = self.unit_positions[unit_id]
+        for unit_id, (x, y, unit_type, a, b, c, d, h) in self.units.items():
             type_name = UnitTypeInfo.get_type_name(unit_type)
             
             unit_button = QPushButton(f"Unit ID {unit_id}: {type_name} ({unit_type}) at ({x},{y})")
@@ -368,9 +367,9 @@ class UnitEditor(QDialog):
     
     def select_unit(self, unit_id):
         """Select a unit and show its properties"""
-        if unit_id in self.unit_positions:
+        if unit_id in self.units:
             self.current_unit_id = unit_id
-            x, y, unit_type, a, b, c, d, h = self.unit_positions[unit_id]
+            x, y, unit_type, a, b, c, d, h = self.units.get(unit_id)
             
             # Populate form fields
             self.unit_x_spin.setValue(x)
@@ -448,18 +447,18 @@ class UnitEditor(QDialog):
         h = self.prop_spins[4].value()
         
         # Update unit data
-        self.unit_positions[self.current_unit_id] = (x, y, unit_type, a, b, c, d, h)
+        self.units.set(self.current_unit_id, x, y, unit_type, a, b, c, d, h)
         
         # Special case for player (unit 0)
         if unit_type == 1:  # Player
             # Always assign player to unit 0
-            self.unit_positions[0] = (x, y, unit_type, a, b, c, d, h)
+            self.units.set(0, x, y, unit_type, a, b, c, d, h)
         
         # Refresh the unit list
         self.populate_unit_list()
         
         # Update the map display
-        self.parent.update_map_display()
+        self.parent.on_units_edited()
     
     def delete_unit(self):
         """Delete the current unit"""
@@ -471,8 +470,7 @@ class UnitEditor(QDialog):
             return
         
         # Remove the unit
-        if self.current_unit_id in self.unit_positions:
-            del self.unit_positions[self.current_unit_id]
+        self.units.delete(self.current_unit_id)
         
         # Clear current selection
         self.current_unit_id = None
@@ -482,7 +480,7 @@ class UnitEditor(QDialog):
         self.populate_unit_list()
         
         # Update the map display
-        self.parent.update_map_display()
+        self.parent.on_units_edited()
     
     def add_unit(self):
         """Add a new unit with the specified properties"""
@@ -500,16 +498,16 @@ class UnitEditor(QDialog):
         h = self.new_prop_spins[4].value()
         
         # Add the unit
-        self.unit_positions[unit_id] = (x, y, unit_type, a, b, c, d, h)
+        self.units.set(unit_id, x, y, unit_type, a, b, c, d, h)
         
         # Special case for player (type 1)
         if unit_type == 1:  # Player
             # Always assign player to unit 0
-            self.unit_positions[0] = (x, y, unit_type, a, b, c, d, h)
+            self.units.set(0, x, y, unit_type, a, b, c, d, h)
         
         # Refresh the unit list and switch to the edit tab
         self.populate_unit_list()
         self.tabs.setCurrentIndex(0)  # Switch to edit tab
         
         # Update the map display
-        self.parent.update_map_display()
+        self.parent.on_units_edited()
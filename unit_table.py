@@ -0,0 +1,181 @@
+# unit table
+from constants import (UNIT_TYPES_OFFSET, UNIT_X_OFFSET,
+                       UNIT_Y_OFFSET, UNIT_A_OFFSET,
+                       UNIT_B_OFFSET, UNIT_C_OFFSET,
+                       UNIT_D_OFFSET, UNIT_H_OFFSET,
+                       UNIT_BLOCK_SIZE)
+
+# File offsets of the unit property columns, in file order
+UNIT_COLUMN_OFFSETS = (UNIT_TYPES_OFFSET, UNIT_X_OFFSET, UNIT_Y_OFFSET,
+                       UNIT_A_OFFSET, UNIT_B_OFFSET, UNIT_C_OFFSET,
+                       UNIT_D_OFFSET, UNIT_H_OFFSET)
+
+class UnitTable:
+    """Unit properties stored as eight 64-byte columns, like in the level file"""
+
+    def __init__(self, size=UNIT_BLOCK_SIZE):
+        self.size = size
+        self.types = bytearray(size)
+        self.xs = bytearray(size)
+        self.ys = bytearray(size)
+        self.a = bytearray(size)
+        self.b = bytearray(size)
+        self.c = bytearray(size)
+        self.d = bytearray(size)
+        self.h = bytearray(size)
+        # Columns in file order (matches UNIT_COLUMN_OFFSETS)
+        self.columns = (self.types, self.xs, self.ys, self.a,
+                        self.b, self.c, self.d, self.h)
+        # 1 for every slot that holds a unit, deleted slots are saved as zeros
+        self.used = bytearray(size)
+        # Spatial index: (x, y) -> sorted list of unit ids on that tile
+        self.cells = {}
+        # Tiles whose units changed since take_changes(), all_changed for all
+        self.changed_cells = set()
+        self.all_changed = True
+
+    def __contains__(self, unit_id):
+        return 0 <= unit_id < self.size and self.used[unit_id] != 0
+
+    def __len__(self):
+        return self.used.count(1)
+
+    def ids(self):
+        """Get the ids of all units in ascending order"""
+        return self._find_all(self.used, 1)
+
+    def get(self, unit_id):
+        """Get (x, y, type, a, b, c, d, h) of a unit, or None"""
+        if unit_id not in self:
+            return None
+        return (self.xs[unit_id], self.ys[unit_id], self.types[unit_id],
+                self.a[unit_id], self.b[unit_id], self.c[unit_id],
+                self.d[unit_id], self.h[unit_id])
+
+    def set(self, unit_id, x, y, unit_type, a, b, c, d, h):
+        """Add or change a unit"""
+        self._unindex(unit_id)
+        self.types[unit_id] = unit_type
+        self.xs[unit_id] = x
+        self.ys[unit_id] = y
+        self.a[unit_id] = a
+        self.b[unit_id] = b
+        self.c[unit_id] = c
+        self.d[unit_id] = d
+        self.h[unit_id] = h
+        self.used[unit_id] = 1
+        self._index(unit_id)
+
+    def delete(self, unit_id):
+        """Remove a unit, its slot is written as zeros"""
+        if unit_id in self:
+            self._unindex(unit_id)
+            for column in self.columns:
+                column[unit_id] = 0
+            self.used[unit_id] = 0
+
+    def clear(self):
+        """Remove all units"""
+        for column in self.columns:
+            column[:] = bytes(self.size)
+        self.used[:] = bytes(self.size)
+        self.cells = {}
+        self.all_changed = True
+
+    def items(self):
+        """Iterate over (unit_id, (x, y, type, a, b, c, d, h)) of all units"""
+        units = zip(self.xs, self.ys, self.types, self.a,
+                    self.b, self.c, self.d, self.h)
+        return ((unit_id, unit) for unit_id, (used, unit) in
+                enumerate(zip(self.used, units)) if used)
+
+    def load_columns(self, buffer, offset):
+        """Copy all columns from a level buffer, the units start at offset"""
+        for column, column_offset in zip(self.columns, UNIT_COLUMN_OFFSETS):
+            start = offset + column_offset
+            column[:] = buffer[start:start + self.size]
+        self.used[:] = b'\x01' * self.size
+        self._rebuild_index()
+
+    def save_columns(self, buffer, offset):
+        """Copy all columns into a level buffer, the units start at offset"""
+        for column, column_offset in zip(self.columns, UNIT_COLUMN_OFFSETS):
+            start = offset + column_offset
+            buffer[start:start + self.size] = column
+
+    def ids_of_type(self, unit_type):
+        """Get the ids of all units of the given type"""
+        return [unit_id for unit_id in self._find_all(self.types, unit_type)
+                if self.used[unit_id]]
+
+    def ids_at(self, x, y):
+        """Get the ids of all units on the tile (x, y)"""
+        return list(self.cells.get((x, y), ()))
+
+    def ids_in_rect(self, x, y, width, height):
+        """Get the ids of all units inside the given map rectangle"""
+        found = []
+        if width * height <= len(self.cells):
+            # Small rectangle: look up its tiles
+            for tile_y in range(y, y + height):
+                for tile_x in range(x, x + width):
+                    found.extend(self.cells.get((tile_x, tile_y), ()))
+        else:
+            # Large rectangle: check the occupied tiles
+            for (tile_x, tile_y), unit_ids in self.cells.items():
+                if x <= tile_x < x + width and y <= tile_y < y + height:
+                    found.extend(unit_ids)
+        return sorted(found)
+
+    def take_changes(self):
+        """Get the tiles whose units changed since the last call, None for all"""
+        changed = None if self.all_changed else self.changed_cells
+        self.changed_cells = set()
+        self.all_changed = False
+        return changed
+
+    def snapshot(self):
+        """Get a copy of the whole table as bytes"""
+        return b''.join(self.columns) + bytes(self.used)
+
+    def restore(self, snapshot):
+        """Restore the table from snapshot()"""
+        for i, column in enumerate(self.columns + (self.used,)):
+            column[:] = snapshot[i * self.size:(i + 1) * self.size]
+        self._rebuild_index()
+
+    def _index(self, unit_id):
+        """Add a unit to the spatial index"""
+        cell = (self.xs[unit_id], self.ys[unit_id])
+        unit_ids = self.cells.setdefault(cell, [])
+        unit_ids.append(unit_id)
+        unit_ids.sort()
+        self.changed_cells.add(cell)
+
+    def _unindex(self, unit_id):
+        """Remove a unit from the spatial index"""
+        if not self.used[unit_id]:
+            return
+        cell = (self.xs[unit_id], self.ys[unit_id])
+        unit_ids = self.cells[cell]
+        unit_ids.remove(unit_id)
+        if not unit_ids:
+            del self.cells[cell]
+        self.changed_cells.add(cell)
+
+    def _rebuild_index(self):
+        """Build the spatial index from the columns"""
+        self.cells = {}
+        self.all_changed = True
+        for unit_id in self.ids():
+            self.cells.setdefault((self.xs[unit_id], self.ys[unit_id]), []).append(unit_id)
+
+    @staticmethod
+    def _find_all(column, value):
+        """Get all indices of a byte value in a column"""
+        found = []
+        index = column.find(value)
+        while index != -1:
+            found.append(index)
+            index = column.find(value, index + 1)
+        return found